@@ -0,0 +1,96 @@
+"""Benchmark of the memory footprint of the signed URLs cache.
+
+Puts 1M signed URLs (by default) in the in-memory cache, in batches of
+`MAX_URLS` sharing the same expiry, as the signing does. Reports the memory
+used by the cache entries (traced with tracemalloc, URL keys excepted), and
+the time to store and look up the URLs (without tracing).
+
+Usage: python benchmarks/bench_cache.py [--urls 1000000]
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from teledetection.sdk.settings import MAX_URLS
+from teledetection.sdk.signing import (
+    CACHE,
+    SignedURLBatch,
+    SignURLRoute,
+    _classify_urls,
+    _store_signed_url_batches,
+)
+
+QUERY = (
+    "?X-Amz-Algorithm=AWS4-HMAC-SHA256"
+    "&X-Amz-Credential=0123456789ABCDEFGHIJ%2F20240101%2Fus-east-1%2Fs3%2Faws4_request"
+    "&X-Amz-Date=20240101T000000Z&X-Amz-Expires=86400&X-Amz-SignedHeaders=host"
+    "&X-Amz-Signature="
+)
+
+
+def make_batches(urls: list[str]) -> list[SignedURLBatch]:
+    """Create the signed URL batches, as returned by the signing endpoint."""
+    expiry = datetime.now(timezone.utc) + timedelta(days=1)
+    return [
+        SignedURLBatch(
+            expiry=expiry,
+            hrefs={
+                url: f"{url}{QUERY}{i:064x}"
+                for i, url in enumerate(urls[start : start + MAX_URLS], start)
+            },
+        )
+        for start in range(0, len(urls), MAX_URLS)
+    ]
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--urls", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    CACHE.max_entries = CACHE.max_bytes = args.urls * 1000
+    urls = [
+        f"https://s3-data.meso.umontpellier.fr/bucket/{i}/B04.tif"
+        for i in range(args.urls)
+    ]
+
+    tracemalloc.start()
+    gc.collect()
+    baseline = tracemalloc.get_traced_memory()[0]
+    batches = make_batches(urls)
+    _store_signed_url_batches(batches, route=SignURLRoute.SIGN_URLS_GET)
+    del batches
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    # Time the store again, without tracing
+    CACHE.clear()
+    batches = make_batches(urls)
+    start = time.perf_counter()
+    _store_signed_url_batches(batches, route=SignURLRoute.SIGN_URLS_GET)
+    store_time = time.perf_counter() - start
+    del batches
+
+    start = time.perf_counter()
+    buckets = _classify_urls(urls)
+    lookup_time = time.perf_counter() - start
+    assert len(buckets.cached) == args.urls
+
+    start = time.perf_counter()
+    for url in urls:
+        CACHE[url].href  # pylint: disable = expression-not-assigned
+    href_time = time.perf_counter() - start
+
+    print(f"cache entries: {used / 2**20:.0f} MiB ({used / args.urls:.0f} B/URL)")
+    print(f"store:        {store_time:6.2f} s")
+    print(f"classify:     {lookup_time:6.2f} s")
+    print(f"get href:     {href_time:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
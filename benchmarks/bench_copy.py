@@ -0,0 +1,65 @@
+"""Benchmark of the copy strategies used when signing STAC objects.
+
+Signs an ItemCollection of items with large footprints with `copy=True`
+(full clone) and with `copy=CopyStrategy.ASSETS` (copy of the assets only).
+All the URLs are in cache beforehand, so that only the copy and the cache
+lookups are measured.
+
+Usage: python benchmarks/bench_copy.py [--items 50000] [--assets 15]
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+
+from pystac import Asset, Item, ItemCollection
+
+from teledetection.sdk.signing import CACHE, CopyStrategy, SignedURL, sign
+
+
+def make_item_collection(n_items: int, n_assets: int, n_vertices: int):
+    """Create an item collection with large footprints."""
+    now = datetime.now(timezone.utc)
+    expiry = now + timedelta(days=1)
+    ring = [[i / n_vertices, (i % 7) / 7] for i in range(n_vertices)]
+    geometry = {"type": "Polygon", "coordinates": [ring + [ring[0]]]}
+    items = []
+    for i_item in range(n_items):
+        item = Item(
+            id=f"item-{i_item}",
+            geometry=geometry,
+            bbox=[0, 0, 1, 1],
+            datetime=now,
+            properties={"platform": "sentinel-2", "eo:cloud_cover": i_item % 100},
+        )
+        for i_asset in range(n_assets):
+            href = (
+                "https://s3-data.meso.umontpellier.fr/bucket/"
+                f"{i_item}/B{i_asset:02d}.tif"
+            )
+            CACHE[href] = SignedURL(expiry=expiry, href=f"{href}?X-Amz-Signature=x")
+            item.add_asset(f"B{i_asset:02d}", Asset(href))
+        items.append(item)
+    return ItemCollection(items, clone_items=False)
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=50_000)
+    parser.add_argument("--assets", type=int, default=15)
+    parser.add_argument("--vertices", type=int, default=200)
+    args = parser.parse_args()
+
+    CACHE.max_entries = CACHE.max_bytes = args.items * args.assets * 1000
+    item_collection = make_item_collection(args.items, args.assets, args.vertices)
+    for name, copy in [("clone()", True), ("assets only", CopyStrategy.ASSETS)]:
+        start = time.perf_counter()
+        signed = sign(item_collection, copy=copy)
+        elapsed = time.perf_counter() - start
+        assert signed.items[0].assets["B00"].href.endswith("X-Amz-Signature=x")
+        print(f"{name:<12} {elapsed:8.2f} s ({args.items / elapsed:10.0f} items/s)")
+
+
+if __name__ == "__main__":
+    main()
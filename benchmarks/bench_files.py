@@ -0,0 +1,76 @@
+"""Benchmark of the streaming re-signing of large text files.
+
+Writes a synthetic NDJSON file of STAC items (2 GB by default) with URLs
+pointing to the storage, then signs all of them in place with
+`update_hrefs_in_file`. The distinct URLs are in cache beforehand, so that
+no signing endpoint is needed. Reports the throughput and the peak memory.
+
+Usage: python benchmarks/bench_files.py [--size 2000] [--urls 100000]
+"""
+
+import argparse
+import json
+import os
+import resource
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from teledetection.sdk.files import update_hrefs_in_file
+from teledetection.sdk.signing import CACHE, SignedURL
+
+
+def make_file(filepath: str, size_mb: int, n_urls: int) -> list[str]:
+    """Write the synthetic NDJSON file, and return its distinct URLs."""
+    urls = [
+        f"https://s3-data.meso.umontpellier.fr/bucket/{i}/B04.tif"
+        for i in range(n_urls)
+    ]
+    size = size_mb * 1024 * 1024
+    with open(filepath, "w", encoding="utf8") as file_handle:
+        i_item = 0
+        while file_handle.tell() < size:
+            item = {
+                "type": "Feature",
+                "id": f"item-{i_item}",
+                "properties": {"datetime": "2024-01-01T00:00:00Z"},
+                "assets": {
+                    f"B{i_asset:02d}": {
+                        "href": urls[(i_item * 10 + i_asset) % n_urls],
+                        "type": "image/tiff; application=geotiff",
+                    }
+                    for i_asset in range(10)
+                },
+            }
+            file_handle.write(json.dumps(item) + "\n")
+            i_item += 1
+    return urls
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=2000, help="File size (MB)")
+    parser.add_argument("--urls", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filepath = os.path.join(tmpdir, "items.ndjson")
+        urls = make_file(filepath, args.size, args.urls)
+        expiry = datetime.now(timezone.utc) + timedelta(days=1)
+        for url in urls:
+            CACHE[url] = SignedURL(expiry=expiry, href=f"{url}?X-Amz-Signature=x")
+
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        update_hrefs_in_file(filepath)
+        elapsed = time.perf_counter() - start
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    print(f"signed {args.size} MB in {elapsed:.2f} s ({args.size / elapsed:.1f} MB/s)")
+    increase = (rss_after - rss_before) / 1024
+    print(f"peak RSS {rss_after / 1024:.0f} MB (+{increase:.0f} MB while signing)")
+
+
+if __name__ == "__main__":
+    main()
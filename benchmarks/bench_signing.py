@@ -0,0 +1,229 @@
+"""Load test of the signing, against a local fake signing endpoint.
+
+Each scenario runs in a fresh process (cold cache, own peak RSS), signing
+storage URLs through the public API:
+
+- sign_urls: a list of distinct URLs
+- sign_item_collection: an ItemCollection (10 assets per item)
+- sign_mapping: a FeatureCollection dict (10 assets per feature)
+- modifier: `sign_inplace` on raw pages of 100 features, as the pystac_client
+  modifier does
+
+Reports the throughput, the p50/p99 latency of the signing requests and the
+peak RSS. Results can be saved, and compared to a baseline to fail (exit
+code 1) on regressions.
+
+Usage: python benchmarks/bench_signing.py [--sizes 1000,100000,1000000]
+    [--scenarios sign_urls,...] [--latency 0.02] [--expiry 3600]
+    [--failure-rate 0.0] [--max-rate 0] [--save results.json]
+    [--baseline baseline.json] [--tolerance 0.2]
+"""
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from fake_server import FakeSigningServer
+
+SCENARIOS = ("sign_urls", "sign_item_collection", "sign_mapping", "modifier")
+ASSETS_PER_ITEM = 10
+ITEMS_PER_PAGE = 100
+
+
+def _urls(n_urls: int) -> list[str]:
+    """Return distinct storage URLs."""
+    return [
+        f"https://s3-data.meso.umontpellier.fr/bucket/{i // ASSETS_PER_ITEM}/"
+        f"B{i % ASSETS_PER_ITEM:02d}.tif"
+        for i in range(n_urls)
+    ]
+
+
+def _feature(i_item: int, urls: list[str]) -> dict:
+    """Return a STAC item dict, with the given asset URLs."""
+    return {
+        "type": "Feature",
+        "stac_version": "1.0.0",
+        "id": f"item-{i_item}",
+        "geometry": {"type": "Point", "coordinates": [3.87, 43.61]},
+        "bbox": [3.87, 43.61, 3.87, 43.61],
+        "properties": {"datetime": "2024-01-01T00:00:00Z"},
+        "links": [],
+        "assets": {f"B{i:02d}": {"href": url} for i, url in enumerate(urls)},
+    }
+
+
+def _features(n_urls: int) -> list[dict]:
+    """Return STAC item dicts holding `n_urls` asset URLs."""
+    urls = _urls(n_urls)
+    return [
+        _feature(i_item, urls[start : start + ASSETS_PER_ITEM])
+        for i_item, start in enumerate(range(0, n_urls, ASSETS_PER_ITEM))
+    ]
+
+
+def run_scenario(scenario: str, n_urls: int) -> dict:
+    """Run a scenario in the current process, and return its results."""
+    # pylint: disable = import-outside-toplevel
+    from pystac import Item, ItemCollection
+
+    import teledetection
+    from teledetection.sdk import http
+
+    if scenario == "sign_urls":
+        urls = _urls(n_urls)
+        func = lambda: teledetection.sign_urls(urls)  # noqa: E731
+    elif scenario == "sign_item_collection":
+        items = [Item.from_dict(feature) for feature in _features(n_urls)]
+        item_collection = ItemCollection(items, clone_items=False)
+        func = lambda: teledetection.sign_item_collection(item_collection)  # noqa
+    elif scenario == "sign_mapping":
+        features = _features(n_urls)
+        feature_collection = {"type": "FeatureCollection", "features": features}
+        func = lambda: teledetection.sign(feature_collection)  # noqa: E731
+    elif scenario == "modifier":
+        features = _features(n_urls)
+        pages = [
+            {"type": "FeatureCollection", "features": features[i : i + ITEMS_PER_PAGE]}
+            for i in range(0, len(features), ITEMS_PER_PAGE)
+        ]
+
+        def func():
+            for page in pages:
+                teledetection.sign_inplace(page)
+
+    else:
+        raise ValueError(f"Unknown scenario {scenario}")
+
+    # Time each request to the signing endpoint
+    latencies: list[float] = []
+    post = http.session.post
+
+    def timed_post(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return post(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    http.session.post = timed_post
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    quantiles = (
+        statistics.quantiles(latencies, n=100, method="inclusive")
+        if len(latencies) > 1
+        else latencies * 99
+    )
+    return {
+        "seconds": elapsed,
+        "urls_per_s": n_urls / elapsed,
+        "requests": len(latencies),
+        "p50_ms": 1000 * quantiles[49] if quantiles else 0.0,
+        "p99_ms": 1000 * quantiles[98] if quantiles else 0.0,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def check_regressions(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Compare results to a baseline, and return the regressions."""
+    regressions = []
+    for key, result in results.items():
+        if (reference := baseline.get(key)) is None:
+            continue
+        if result["urls_per_s"] < reference["urls_per_s"] * (1 - tolerance):
+            regressions.append(
+                f"{key}: throughput {result['urls_per_s']:.0f} URLs/s "
+                f"< baseline {reference['urls_per_s']:.0f} URLs/s"
+            )
+        if result["peak_rss_mb"] > reference["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(
+                f"{key}: peak RSS {result['peak_rss_mb']:.0f} MB "
+                f"> baseline {reference['peak_rss_mb']:.0f} MB"
+            )
+    return regressions
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sizes", default="1000,100000,1000000")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--expiry", type=int, default=3600)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--max-rate", type=float, default=0.0)
+    parser.add_argument("--save", help="Save the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare the results to this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--run", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_scenario(args.run[0], int(args.run[1]))))
+        return
+
+    results = {}
+    with FakeSigningServer(
+        duration=args.expiry,
+        delay=args.latency,
+        failure_rate=args.failure_rate,
+        max_rate=args.max_rate,
+    ) as server:
+        server.retry_after = 1
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        env = {
+            **os.environ,
+            "TLD_SIGNING_ENDPOINT": server.endpoint,
+            "TLD_DISABLE_AUTH": "true",
+        }
+        print(
+            f"{'scenario':<22}{'URLs':>9}{'time (s)':>10}{'URLs/s':>10}"
+            f"{'requests':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}{'RSS (MB)':>10}"
+        )
+        for n_urls in [int(size) for size in args.sizes.split(",")]:
+            for scenario in args.scenarios.split(","):
+                output = subprocess.run(
+                    [sys.executable, __file__, "--run", scenario, str(n_urls)],
+                    env=env,
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                ).stdout
+                result = results[f"{scenario}@{n_urls}"] = json.loads(output)
+                print(
+                    f"{scenario:<22}{n_urls:>9}{result['seconds']:>10.2f}"
+                    f"{result['urls_per_s']:>10.0f}{result['requests']:>10}"
+                    f"{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+                    f"{result['peak_rss_mb']:>10.0f}"
+                )
+        if args.max_rate:
+            print(f"Requests throttled by the endpoint: {server.n_throttled}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file_handle:
+            json.dump(
+                {"date": datetime.now(timezone.utc).isoformat(), "results": results},
+                file_handle,
+                indent=2,
+            )
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file_handle:
+            baseline = json.load(file_handle)["results"]
+        if regressions := check_regressions(results, baseline, args.tolerance):
+            print("Regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("No regression")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Micro-benchmark of the classification of URLs before signing.
+
+Classifies 1M hrefs (by default): 20% outside the storage domain, 10%
+already signed, the others in cache, with 30% of duplicates overall. No URL
+has to be signed, so that no signing endpoint is needed.
+
+Usage: python benchmarks/bench_urls.py [--urls 1000000]
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse
+
+from teledetection.sdk.settings import S3_STORAGE_DOMAIN
+from teledetection.sdk.expiry import (
+    NotSignedURL,
+    _parse_signed_url_expiry,
+    _parse_signed_url_expiry_slow,
+)
+from teledetection.sdk.signing import (
+    CACHE,
+    SignedURL,
+    _classify_urls,
+    _is_storage_url,
+    sign_urls,
+)
+
+
+def make_urls(n_urls: int) -> list[str]:
+    """Create the hrefs."""
+    now = datetime.now(timezone.utc)
+    expiry = now + timedelta(days=1)
+    n_unique = int(n_urls * 0.7)
+    urls = []
+    for i in range(n_unique):
+        if i % 10 < 2:
+            urls.append(f"https://example.com/data/{i}/thumbnail.png")
+        elif i % 10 == 2:
+            urls.append(
+                f"https://s3-data.{S3_STORAGE_DOMAIN}/bucket/{i}/B04.tif"
+                "?X-Amz-Algorithm=AWS4-HMAC-SHA256"
+                f"&X-Amz-Date={now.strftime('%Y%m%dT%H%M%SZ')}"
+                "&X-Amz-Expires=86400&X-Amz-Signature=x"
+            )
+        else:
+            url = f"https://s3-data.{S3_STORAGE_DOMAIN}/bucket/{i}/B04.tif"
+            CACHE[url] = SignedURL(expiry=expiry, href=f"{url}?X-Amz-Signature=x")
+            urls.append(url)
+    urls += random.Random(0).choices(urls, k=n_urls - n_unique)
+    return urls
+
+
+def _timed(name: str, n_urls: int, func, *args):
+    """Run and time a function."""
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {elapsed:8.2f} s ({n_urls / elapsed:12.0f} URLs/s)")
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--urls", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    CACHE.max_entries = CACHE.max_bytes = args.urls * 1000
+    urls = make_urls(args.urls)
+
+    def _urlparse_domain(urls):
+        for url in urls:
+            urlparse(url.rstrip("/")).netloc.endswith(S3_STORAGE_DOMAIN)
+
+    def _fast_domain(urls):
+        for url in urls:
+            _is_storage_url(url)
+
+    _timed("domain check (urlparse)", args.urls, _urlparse_domain, urls)
+    _timed("domain check (fast path)", args.urls, _fast_domain, urls)
+
+    def _full_parse(urls):
+        for url in urls:
+            try:
+                _parse_signed_url_expiry_slow(url)
+            except NotSignedURL:
+                pass
+
+    def _fast_parse(urls):
+        for url in urls:
+            _parse_signed_url_expiry(url)
+
+    _timed("signed URL parse (full)", args.urls, _full_parse, urls)
+    _timed("signed URL parse (fast)", args.urls, _fast_parse, urls)
+    _parse_signed_url_expiry.cache_clear()
+    _timed("classification", args.urls, _classify_urls, urls)
+    _timed("sign_urls", args.urls, sign_urls, urls)
+
+
+if __name__ == "__main__":
+    main()
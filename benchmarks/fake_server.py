@@ -0,0 +1,219 @@
+"""Local stand-in for the signing endpoint, for offline benchmarks and tests.
+
+Implements the `sign_urls` and `sign_urls_put` routes, and `openapi.json`,
+with a configurable latency, expiry, failure rate and maximum request rate
+(above which requests are answered with 429 and a `Retry-After` header).
+Signed URLs look like real S3 presigned URLs, but are not valid: their
+signature is "fake" (and "fake-put" for PUT).
+
+Usage: python benchmarks/fake_server.py [--port 8000] [--latency 0.02]
+    [--expiry 3600] [--failure-rate 0.0] [--max-rate 0]
+
+Then: TLD_SIGNING_ENDPOINT=http://127.0.0.1:8000/ TLD_DISABLE_AUTH=true ...
+"""
+
+import argparse
+import gzip
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROUTES = ("sign_urls", "sign_urls_put")
+
+
+class FakeSigningServer(ThreadingHTTPServer):
+    """Fake signing endpoint.
+
+    Every received signing request is recorded in `requests` as a tuple
+    (route, list of URLs), and the `Content-Encoding` of its body in
+    `encodings`. Failures (of status `fail_status`) can be injected with
+    `fail_next`, and throttling (429 with a `Retry-After` of `retry_after`
+    seconds) with `throttle_next`.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        port: int = 0,
+        duration: int = 3600,
+        delay: float = 0.0,
+        failure_rate: float = 0.0,
+        max_rate: float = 0.0,
+    ):
+        """Initialize.
+
+        Args:
+            port: port to listen on (0 picks a free port)
+            duration: duration (seconds) of the signed URLs
+            delay: time (seconds) spent on each signing request
+            failure_rate: ratio of signing requests answered with an error 500
+            max_rate: maximum number of signing requests per second, over a
+                one second window, above which requests are throttled (0 for
+                no limit). Throttled requests are counted in `n_throttled`.
+
+        """
+        self.duration = duration
+        self.delay = delay
+        self.failure_rate = failure_rate
+        self.max_rate = max_rate
+        self.requests: list[tuple[str, list[str]]] = []
+        self.encodings: list[str | None] = []
+        self.fail_next = 0
+        self.fail_status = 400
+        self.throttle_next = 0
+        self.retry_after = 0.0
+        self.n_throttled = 0
+        self.window: list[float] = []
+        self.random = random.Random(0)
+        self.lock = threading.Lock()
+        super().__init__(("127.0.0.1", port), _Handler)
+
+    @property
+    def endpoint(self) -> str:
+        """Base URL of the endpoint."""
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+    def openapi(self) -> dict:
+        """Return the minimal OpenAPI description used by the SDK."""
+        return {
+            "openapi": "3.1.0",
+            "paths": {f"/{route}": {"post": {}} for route in ROUTES},
+            "components": {
+                "securitySchemes": {
+                    "OAuth2PasswordBearer": {
+                        "type": "oauth2",
+                        "flows": {"password": {"tokenUrl": f"{self.endpoint}token"}},
+                    }
+                }
+            },
+        }
+
+    def sign(self, url: str, now: datetime, route: str = "sign_urls") -> str:
+        """Return a fake signed URL (with a "-put" signature for PUT)."""
+        date = now.strftime("%Y%m%dT%H%M%SZ")
+        return (
+            f"{url}?X-Amz-Algorithm=AWS4-HMAC-SHA256"
+            f"&X-Amz-Credential=fake%2F{date[:8]}%2Fus-east-1%2Fs3%2Faws4_request"
+            f"&X-Amz-Date={date}&X-Amz-Expires={self.duration}"
+            "&X-Amz-SignedHeaders=host&X-Amz-Signature=fake"
+            + ("-put" if route == "sign_urls_put" else "")
+        )
+
+    def _throttled(self) -> bool:
+        """Whether a request is above the maximum rate (the lock is held)."""
+        if self.throttle_next > 0:
+            self.throttle_next -= 1
+            return True
+        now = time.monotonic()
+        self.window = [date for date in self.window if date > now - 1]
+        if self.max_rate and len(self.window) >= self.max_rate:
+            self.n_throttled += 1
+            return True
+        self.window.append(now)
+        return False
+
+    def handle_signing(self, route: str, urls: list[str], encoding: str | None):
+        """Return the status, headers and payload of a signing request."""
+        with self.lock:
+            self.requests.append((route, urls))
+            self.encodings.append(encoding)
+            fail = self.fail_next > 0
+            self.fail_next -= int(fail)
+            throttle = not fail and self._throttled()
+            status = self.fail_status
+            if not (fail or throttle) and self.failure_rate:
+                fail = self.random.random() < self.failure_rate
+                status = 500
+        if throttle:
+            headers = {"Retry-After": str(self.retry_after)}
+            return 429, headers, {"detail": "too many requests"}
+        if self.delay:
+            time.sleep(self.delay)
+        if fail:
+            return status, {}, {"detail": "injected failure"}
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        return (
+            200,
+            {},
+            {
+                "hrefs": {url: self.sign(url, now, route) for url in urls},
+                "expiry": (now + timedelta(seconds=self.duration)).isoformat(),
+            },
+        )
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Request handler of the fake signing endpoint."""
+
+    server: FakeSigningServer
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately: don't wait for delayed ACKs
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):  # pylint: disable = arguments-differ
+        """Silence the server."""
+
+    def _reply(self, status: int, payload: dict, headers: dict | None = None):
+        """Send a JSON response."""
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):  # pylint: disable = invalid-name
+        """Serve openapi.json."""
+        if self.path.strip("/") == "openapi.json":
+            self._reply(200, self.server.openapi())
+        else:
+            self._reply(404, {"detail": "Not Found"})
+
+    def do_POST(self):  # pylint: disable = invalid-name
+        """Sign URLs."""
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        encoding = self.headers.get("Content-Encoding")
+        if encoding == "gzip":
+            body = gzip.decompress(body)
+        route = self.path.strip("/")
+        if route not in ROUTES:
+            self._reply(404, {"detail": "Not Found"})
+            return
+        urls = json.loads(body)["urls"]
+        status, headers, payload = self.server.handle_signing(route, urls, encoding)
+        self._reply(status, payload, headers)
+
+
+def main():
+    """Run the fake signing endpoint until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--expiry", type=int, default=3600)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--max-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    with FakeSigningServer(
+        port=args.port,
+        duration=args.expiry,
+        delay=args.latency,
+        failure_rate=args.failure_rate,
+        max_rate=args.max_rate,
+    ) as server:
+        server.retry_after = 1
+        print(f"Fake signing endpoint on {server.endpoint}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,23 @@
 
 from importlib.metadata import version, PackageNotFoundError
 from teledetection.sdk.signing import (
+    CopyStrategy,
     sign,
     sign_inplace,
     sign_urls,
     sign_item,
     sign_asset,
     sign_item_collection,
+    sign_iter,
     sign_url_put,
 )  # noqa
+from .sdk.aio import (
+    async_sign,
+    async_sign_inplace,
+    async_sign_urls,
+    async_sign_item_collection,
+)  # noqa
+from .sdk.breaker import SigningUnavailable  # noqa
 from .sdk.oauth2 import OAuth2Session  # noqa
 from .sdk.http import get_headers, get_userinfo, get_username
 
@@ -13,8 +13,15 @@ from .sdk.logger import get_logger_for
 from .sdk.model import ApiKey
 from .sdk.http import OAuth2ConnectionMethod
 from .sdk.utils import create_session
+from .sdk.proxy import DEFAULT_PROXY_PORT, serve
 from .sdk.signing import sign_string
-from .sdk.files import update_hrefs_in_file, update_hrefs_in_qgz
+from .sdk.storage import DEFAULT_STORAGE_ENDPOINT
+from .sdk.files import (
+    sign_vrt_file,
+    update_hrefs_in_dir,
+    update_hrefs_in_file,
+    update_hrefs_in_qgz,
+)
 
 
 @click.group(
@@ -128,12 +135,24 @@ def do_sign_file(filepath: str):
     log.info("All URLs in file %s updated", filepath)
 
 
+def do_sign_vrt(filepath: str):
+    """Sign all URLs in the provided VRT file (modified in place)."""
+    sign_vrt_file(src=filepath)
+    log.info("All URLs in VRT %s updated", filepath)
+
+
 def do_sign_qgz(filepath: str):
     """Sign all URLs in the provided QGIS project file (modified in place)."""
     update_hrefs_in_qgz(filepath=filepath)
     log.info("All URLs in QGIS project %s updated", filepath)
 
 
+def do_sign_dir(dirpath: str):
+    """Sign all URLs in the files of the provided directory (modified in place)."""
+    updated = update_hrefs_in_dir(dirpath=dirpath)
+    log.info("%s file(s) in directory %s updated", len(updated), dirpath)
+
+
 API_KEY_OPS = {
     "create": lambda arg: do_create_key(description=arg),
     "revoke": lambda arg: do_revoke_key(access_key=arg),
@@ -148,6 +167,8 @@ SIGN_KEY_OPS = {
     "url": lambda arg: do_sign_url(url=arg),
     "file": lambda arg: do_sign_file(filepath=arg),
     "qgis": lambda arg: do_sign_qgz(filepath=arg),
+    "vrt": lambda arg: do_sign_vrt(filepath=arg),
+    "dir": lambda arg: do_sign_dir(dirpath=arg),
 }
 
 
@@ -199,6 +220,8 @@ def sign(ctx, operation: str, argument: str):
       url         : Sign an URL
       file        : Sign all URLs in the provided file (modified in place)
       qgis        : Sign all URLs of a QGIS project file (modified in place)
+      vrt         : Sign all URLs of a GDAL VRT file (modified in place)
+      dir         : Sign all URLs of the VRT, QGIS and JSON files of a directory
     """
     if not operation:
         click.echo(ctx.get_help())
@@ -206,6 +229,25 @@ def sign(ctx, operation: str, argument: str):
     SIGN_KEY_OPS[operation](argument)
 
 
+@tld.command()
+@click.option("--host", type=str, default="127.0.0.1", help="Address to listen on")
+@click.option("-p", "--port", type=int, default=DEFAULT_PROXY_PORT, help="Port")
+@click.option(
+    "--storage_endpoint",
+    type=str,
+    help="Storage endpoint requests are forwarded to",
+    default=DEFAULT_STORAGE_ENDPOINT,
+)
+def proxy(host: str, port: int, storage_endpoint: str):
+    """Serve the storage locally, signing URLs on the fly.
+
+    \b
+    Files can then be read with stable URLs, e.g. with GDAL:
+      gdalinfo /vsicurl/http://127.0.0.1:8089/<bucket>/<key>
+    """
+    serve(host=host, port=port, storage_endpoint=storage_endpoint)
+
+
 try:
     from .upload import diff
     from .upload.stac import (
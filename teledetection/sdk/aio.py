@@ -0,0 +1,306 @@
+"""Asyncio signing API.
+
+Requires `httpx` (`pip install teledetection[async]`).
+The cache, single-flight and refresh-ahead semantics are the same as for the
+synchronous API, with which the caches are shared.
+"""
+
+import asyncio
+import time
+import weakref
+from typing import Any, Callable, Dict, cast
+
+from pystac import ItemCollection
+from pystac_client import ItemSearch
+
+from .cache import CacheEntry
+from .http import encode_json_body, session
+from .logger import get_logger_for
+from .ratelimit import RATE_LIMITER, retry_after_delay
+from .settings import ENV
+from .dispatch import (
+    BREAKER,
+    SignURLRoute,
+    SignedURLBatch,
+    _failed_chunks,
+    _make_chunks,
+    _parse_signed_url_batch,
+    _request_recorder,
+    _serve_stale,
+    _signing_params,
+)
+from .signing import (
+    CACHE,
+    SIGN_URLS_OVERRIDE,
+    _claim_in_flight,
+    _classify_urls,
+    _is_storage_url,
+    _release_in_flight,
+    _store_signed_url_batches,
+    _track_used,
+    sign,
+)
+
+log = get_logger_for(__name__)
+
+# One HTTP client per event loop, as clients can't be shared across loops
+_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def _get_client():
+    """Return the HTTP client of the running event loop."""
+    try:
+        import httpx  # pylint: disable = import-outside-toplevel
+    except ImportError as err:
+        raise ImportError(
+            "The asyncio API requires httpx. "
+            "To install it, use `pip install teledetection[async]`"
+        ) from err
+    loop = asyncio.get_running_loop()
+    if loop not in _clients:
+        # Connection errors are retried like with the session (not with the
+        # circuit breaker, so that each one counts as a failure)
+        transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(max_connections=ENV.tld_signing_workers),
+            retries=0 if ENV.tld_breaker else ENV.tld_retry_total,
+        )
+        _clients[loop] = httpx.AsyncClient(
+            timeout=ENV.tld_request_timeout, transport=transport
+        )
+    return _clients[loop]
+
+
+async def _post(
+    route: str,
+    params: Dict,
+    headers: Dict[str, str],
+    record: Callable[[float, bool], None] | None = None,
+) -> Any:
+    """Perform a POST request, rate limited like the session.
+
+    As with the session, throttled requests (429) are retried after the
+    `Retry-After` delay, and other errors are not.
+    `record` is called with the latency (seconds) and success of the last
+    HTTP round trip, without the rate limiting waits.
+    """
+    client = _get_client()
+    url = f"{session.get_method().endpoint}{route}"
+    log.debug("POST to %s", url)
+    body, body_headers = encode_json_body(params)
+    headers = {**headers, **body_headers}
+    for attempt in range(ENV.tld_retry_total + 1):
+        # The rate limiter may lock a file shared by processes (blocking)
+        if (delay := await asyncio.to_thread(RATE_LIMITER.reserve)) > 0:
+            await asyncio.sleep(delay)
+        start = time.perf_counter()
+        try:
+            response = await client.post(url, content=body, headers=headers)
+        except Exception:
+            if record:
+                record(time.perf_counter() - start, False)
+            raise
+        latency = time.perf_counter() - start
+        if response.status_code != 429 or attempt == ENV.tld_retry_total:
+            break
+        await asyncio.to_thread(
+            RATE_LIMITER.pause, retry_after_delay(response.headers, attempt)
+        )
+    if record:
+        record(latency, not response.is_error)
+    if response.is_error:
+        log.error(response.text)
+    response.raise_for_status()
+    return response.json()
+
+
+async def _async_request_signed_urls(
+    urls: list[str], route: SignURLRoute
+) -> Dict[str, CacheEntry]:
+    """Sign URLs with the signing endpoint, bypassing the cache.
+
+    Chunks are sent concurrently, with at most `ENV.tld_signing_workers` in
+    flight. Only the chunks that failed are sent again, up to
+    `ENV.tld_signing_chunk_retries` times.
+
+    Args:
+        urls: urls
+        route: route (API)
+
+    Returns:
+        dict of SignedURL: key = original URL, value = signed URL
+
+    """
+    # Getting the headers may refresh the OAuth2 token (blocking): this is
+    # done once for all the chunks, in a worker thread
+    method = session.get_method()
+    headers = {**session.headers, **await asyncio.to_thread(method.get_headers)}
+    semaphore = asyncio.Semaphore(ENV.tld_signing_workers)
+
+    async def _sign_chunk(chunk: list[str]) -> SignedURLBatch:
+        """Sign one chunk."""
+        async with semaphore:
+            with BREAKER.guard():
+                payload = await _post(
+                    route.value,
+                    _signing_params(chunk),
+                    headers,
+                    record=_request_recorder(route, len(chunk)),
+                )
+                return _parse_signed_url_batch(payload, chunk)
+
+    chunks = _make_chunks(urls)
+    results: list[Any] = [None] * len(chunks)
+    pending = list(range(len(chunks)))
+    for attempt in range(ENV.tld_signing_chunk_retries + 1):
+        outcomes = await asyncio.gather(
+            *(_sign_chunk(chunks[i_chunk]) for i_chunk in pending),
+            return_exceptions=True,
+        )
+        errors = {}
+        for i_chunk, outcome in zip(pending, outcomes):
+            if isinstance(outcome, BaseException):
+                errors[i_chunk] = outcome
+            else:
+                results[i_chunk] = outcome
+        if not (pending := _failed_chunks(errors, len(chunks), attempt)):
+            break
+
+    # Storing may write the disk cache (blocking)
+    return await asyncio.to_thread(_store_signed_url_batches, results, route=route)
+
+
+async def _async_single_flight(
+    urls: list[str], route: SignURLRoute
+) -> Dict[str, CacheEntry]:
+    """Sign GET URLs, sharing in-flight requests with threads and tasks.
+
+    See :func:`teledetection.sdk.signing._single_flight_signed_urls`.
+
+    """
+    signed_urls, owned, awaited = _claim_in_flight(urls)
+    if owned:
+        try:
+            requested = await _async_request_signed_urls(urls=list(owned), route=route)
+        except BaseException as err:
+            _release_in_flight(owned, err=err)
+            raise
+        _release_in_flight(owned, signed_urls=requested)
+        signed_urls.update(requested)
+    for url, future in awaited.items():
+        signed_urls[url] = await asyncio.wrap_future(future)
+    return signed_urls
+
+
+async def _async_generic_sign_urls(
+    urls: list[str], route: SignURLRoute
+) -> Dict[str, str]:
+    """Sign URLs with a S3 Token, without blocking the event loop.
+
+    See :func:`teledetection.sdk.signing._generic_sign_urls`.
+
+    Args:
+        urls: List of HREF to sign
+        route: API route
+
+    Returns:
+        dict of signed HREF: key = original URL, value = signed URL
+
+    """
+    if route != SignURLRoute.SIGN_URLS_GET:
+        # For write access, we don't filter out URLs.
+        urls = list(dict.fromkeys(urls))
+        signed_hrefs = {url: url for url in urls if not _is_storage_url(url)}
+        to_sign = [url for url in urls if url not in signed_hrefs]
+        if to_sign:
+            signed_urls = await _async_request_signed_urls(urls=to_sign, route=route)
+            signed_hrefs.update({url: su.href for url, su in signed_urls.items()})
+        return signed_hrefs
+
+    # The lookups may read the disk cache (blocking)
+    buckets = await asyncio.to_thread(_classify_urls, urls)
+    signed_urls = {**buckets.already_signed, **buckets.cached}
+    if buckets.to_sign:
+        try:
+            signed_urls.update(await _async_single_flight(buckets.to_sign, route))
+        except Exception as err:
+            signed_urls.update(
+                await asyncio.to_thread(_serve_stale, buckets.to_sign, err, CACHE)
+            )
+    _track_used(signed_urls)
+    signed_hrefs = {url: url for url in buckets.foreign}
+    signed_hrefs.update({url: su.href for url, su in signed_urls.items()})
+    return signed_hrefs
+
+
+async def async_sign_urls(urls: list[str]) -> Dict[str, str]:
+    """Sign multiple URLs for GET."""
+    return await _async_generic_sign_urls(urls=urls, route=SignURLRoute.SIGN_URLS_GET)
+
+
+async def async_sign_urls_put(urls: list[str]) -> Dict[str, str]:
+    """Sign multiple URLs for PUT."""
+    return await _async_generic_sign_urls(urls=urls, route=SignURLRoute.SIGN_URLS_PUT)
+
+
+async def async_sign(obj: Any, copy: bool = True) -> Any:
+    """Sign the relevant URL with a S3 token allowing read access.
+
+    This is the asyncio counterpart of :func:`teledetection.sign`, which
+    supports the same objects except `ItemSearch`.
+
+    Args:
+        obj (Any): The object to sign. Must be one of:
+            str (URL), Asset, Item, ItemCollection, Collection, or a mapping.
+        copy (bool): Whether to sign the object in place, or make a copy.
+            Has no effect for immutable objects like strings.
+
+    Returns:
+        Any: A copy of the object where all relevant URLs have been signed
+
+    """
+    if isinstance(obj, ItemSearch):
+        raise TypeError("ItemSearch is not supported by the asyncio API")
+
+    # Collect the URLs, without modifying the object
+    urls: list[str] = []
+
+    def _collect(batch: list[str]) -> Dict[str, str]:
+        urls.extend(batch)
+        return {url: url for url in batch}
+
+    token = SIGN_URLS_OVERRIDE.set(_collect)
+    try:
+        sign(obj, copy=False)
+    finally:
+        SIGN_URLS_OVERRIDE.reset(token)
+
+    # Sign them all at once, then update the object
+    signed_urls = await async_sign_urls(urls)
+    token = SIGN_URLS_OVERRIDE.set(
+        lambda batch: {url: signed_urls[url] for url in batch}
+    )
+    try:
+        return sign(obj, copy=copy)
+    finally:
+        SIGN_URLS_OVERRIDE.reset(token)
+
+
+async def async_sign_inplace(obj: Any) -> Any:
+    """Sign the object in place.
+
+    Can be used as modifier of asynchronous STAC clients.
+    See :func:`teledetection.sdk.aio.async_sign` for more.
+
+    """
+    return await async_sign(obj, copy=False)
+
+
+async def async_sign_item_collection(
+    item_collection: ItemCollection, copy: bool = True
+) -> ItemCollection:
+    """Sign a PySTAC item collection.
+
+    See :func:`teledetection.sign_item_collection` for more.
+
+    """
+    return cast(ItemCollection, await async_sign(item_collection, copy=copy))
@@ -0,0 +1,72 @@
+"""Number of URLs per signing request, static or adaptive."""
+
+import threading
+
+from .logger import get_logger_for
+from .settings import ENV
+
+log = get_logger_for(__name__)
+
+# Bytes of JSON per URL, in addition to the URL itself (quotes, separator)
+URL_JSON_OVERHEAD = 4
+# Number of URLs used to estimate the average URL length
+URL_LENGTH_SAMPLES = 1000
+
+
+class BatchSizer:
+    """Number of URLs per request to the signing endpoint.
+
+    The size is `ENV.tld_max_urls`, unless `ENV.tld_adaptive_batch` is set.
+    In that case, the size is adapted with additive increase and
+    multiplicative decrease: it grows by `ENV.tld_adaptive_batch_min` after
+    each full batch signed faster than `ENV.tld_adaptive_batch_latency`
+    seconds, and is halved after a slower or failed one. It stays between
+    `ENV.tld_adaptive_batch_min` and `ENV.tld_max_urls` (the server limit).
+    In both modes, the JSON payload stays under `ENV.tld_max_request_bytes`.
+    """
+
+    def __init__(self):
+        """Initialize."""
+        self._lock = threading.Lock()
+        self._size: int | None = None
+
+    @property
+    def current(self) -> int:
+        """Current size, before the payload size limit."""
+        if not ENV.tld_adaptive_batch:
+            return ENV.tld_max_urls
+        low = min(ENV.tld_adaptive_batch_min, ENV.tld_max_urls)
+        with self._lock:
+            if self._size is None:
+                self._size = ENV.tld_max_urls
+            self._size = max(low, min(self._size, ENV.tld_max_urls))
+            return self._size
+
+    def size(self, urls: list[str]) -> int:
+        """Return the number of URLs per request to sign the given URLs."""
+        if not urls:
+            return self.current
+        sample = urls[:URL_LENGTH_SAMPLES]
+        url_bytes = sum(len(url) for url in sample) / len(sample) + URL_JSON_OVERHEAD
+        return max(1, min(self.current, int(ENV.tld_max_request_bytes // url_bytes)))
+
+    def record(self, n_urls: int, latency: float, success: bool):
+        """Adapt the size from the outcome of a request.
+
+        Args:
+            n_urls: number of URLs of the request
+            latency: duration of the request (seconds)
+            success: whether the request succeeded
+
+        """
+        if not ENV.tld_adaptive_batch:
+            return
+        current = self.current
+        with self._lock:
+            if not success or latency > ENV.tld_adaptive_batch_latency:
+                self._size = max(ENV.tld_adaptive_batch_min, current // 2)
+            elif n_urls >= current:
+                self._size = current + ENV.tld_adaptive_batch_min
+            else:
+                return
+            log.debug("Signing batch size: %s -> %s", current, self._size)
@@ -0,0 +1,135 @@
+"""Circuit breaker for the requests to the signing endpoint."""
+
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+import requests
+
+from .logger import get_logger_for
+from .metrics import SIGNING_CIRCUIT_OPENED
+from .settings import ENV
+
+log = get_logger_for(__name__)
+
+
+class SigningUnavailable(Exception):
+    """The signing endpoint is unavailable (circuit breaker open)."""
+
+
+def _is_outage(err: BaseException) -> bool:
+    """Whether an error denotes an unavailable endpoint.
+
+    Only transport errors (connection errors and timeouts, of `requests` or
+    `httpx`) and responses of status 5xx or 429 (too many requests, after all
+    retries) do. Other errors (e.g. a bad request, an invalid response or a
+    missing dependency) don't.
+    """
+    response = getattr(err, "response", None)
+    if (status := getattr(response, "status_code", None)) is not None:
+        return status >= 500 or status == 429
+    if isinstance(err, (requests.ConnectionError, requests.Timeout)):
+        return True
+    # httpx is optional: its errors can only be raised once imported
+    httpx = sys.modules.get("httpx")
+    return httpx is not None and isinstance(err, httpx.TransportError)
+
+
+class CircuitBreaker:
+    """Circuit breaker, opened after consecutive failed requests.
+
+    After `ENV.tld_breaker_failures` consecutive failures, the circuit opens:
+    requests fail immediately with `SigningUnavailable` for
+    `ENV.tld_breaker_cooldown` seconds. Then, a single request is let
+    through to probe the endpoint: the circuit closes if it succeeds, and
+    opens again otherwise.
+    """
+
+    def __init__(self):
+        """Initialize."""
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        """Whether requests are currently rejected."""
+        with self._lock:
+            return self._opened_at is not None and (
+                self._probing
+                or time.monotonic() - self._opened_at < ENV.tld_breaker_cooldown
+            )
+
+    def _acquire(self) -> bool:
+        """Let a request through, or raise `SigningUnavailable`.
+
+        Returns:
+            whether the request is the probe of a half-open circuit
+
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            elapsed = time.monotonic() - self._opened_at
+            if self._probing or elapsed < ENV.tld_breaker_cooldown:
+                raise SigningUnavailable(
+                    f"Signing endpoint unavailable after {self._failures} "
+                    "failed requests, retrying in "
+                    f"{max(ENV.tld_breaker_cooldown - elapsed, 0):.0f} s"
+                )
+            self._probing = True
+            return True
+
+    def _release(self, probe: bool, err: BaseException | None):
+        """Record the outcome of a request."""
+        with self._lock:
+            if probe:
+                self._probing = False
+            if err is None or not _is_outage(err):
+                if self._opened_at is not None:
+                    log.info("Signing endpoint available again")
+                self._failures = 0
+                self._opened_at = None
+                return
+            self._failures += 1
+            if probe or (
+                self._opened_at is None
+                and self._failures >= ENV.tld_breaker_failures
+            ):
+                if self._opened_at is None:
+                    SIGNING_CIRCUIT_OPENED.inc()
+                log.warning(
+                    "Signing endpoint unavailable (%s), pausing requests for %s s",
+                    err,
+                    ENV.tld_breaker_cooldown,
+                )
+                self._opened_at = time.monotonic()
+
+    @contextmanager
+    def guard(self) -> Iterator[None]:
+        """Let the request in the context through, and record its outcome."""
+        if not ENV.tld_breaker:
+            yield
+            return
+        probe = self._acquire()
+        try:
+            yield
+        except Exception as err:
+            self._release(probe, err)
+            raise
+        except BaseException:
+            # Cancelled: no outcome, but another request can probe
+            with self._lock:
+                self._probing = self._probing and not probe
+            raise
+        self._release(probe, None)
+
+    def reset(self):
+        """Close the circuit."""
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
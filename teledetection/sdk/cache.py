@@ -0,0 +1,411 @@
+"""Caches for signed URLs."""
+
+import heapq
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping, MutableMapping
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, Protocol, Tuple
+
+from .logger import get_logger_for
+from .settings import ENV, get_cache_path
+
+log = get_logger_for(__name__)
+
+# Rough memory footprint of one entry, besides its key and signature (record,
+# shared query string, dict and expiry slots)
+MEMORY_CACHE_ENTRY_OVERHEAD = 200
+# Query parameter of the signature, which ends presigned URLs
+SIGNATURE_PARAM = "X-Amz-Signature="
+DISK_CACHE_FILE = "signed_urls.sqlite"
+DISK_CACHE_TIMEOUT = 10
+DISK_CACHE_EVICTION_PERIOD = 60
+DISK_CACHE_MAX_PARAMS = 500
+
+
+class CacheEntry(Protocol):
+    """Cached signed URL."""
+
+    @property
+    def expiry(self) -> datetime:
+        """Expiry date."""
+
+    @property
+    def expires_at(self) -> float:
+        """Expiry, as a POSIX timestamp."""
+
+    @property
+    def href(self) -> str:
+        """Signed URL."""
+
+    def ttl(self) -> float:
+        """Return the number of seconds the signed URL is still valid for."""
+
+
+class CachedSignedURL:
+    """Compact signed URL, as stored in the in-memory cache.
+
+    The expiry is an integer timestamp, which the URLs signed together can
+    share. When the signed URL is the URL followed by a query string ending
+    with the signature, the URL (usually the cache key) and the query string
+    before the signature (usually the same for the URLs signed together) are
+    shared, and only the signature is specific to the entry.
+    """
+
+    __slots__ = ("url", "query", "signature", "expires_at")
+
+    def __init__(self, url: str, href: str, expires_at: int):
+        """Initialize.
+
+        Args:
+            url: URL
+            href: signed URL
+            expires_at: expiry, as a POSIX timestamp
+
+        """
+        if href.startswith(url):
+            query, sep, self.signature = href[len(url) :].rpartition(
+                SIGNATURE_PARAM
+            )
+            self.url = url
+            self.query = sys.intern(query + sep)
+        else:
+            self.url = self.query = ""
+            self.signature = href
+        self.expires_at = expires_at
+
+    @classmethod
+    def from_entry(cls, url: str, entry: CacheEntry) -> "CachedSignedURL":
+        """Create a compact copy of a cache entry."""
+        if isinstance(entry, cls):
+            return entry
+        return cls(url, entry.href, int(entry.expires_at))
+
+    @property
+    def href(self) -> str:
+        """Signed URL."""
+        return f"{self.url}{self.query}{self.signature}"
+
+    @property
+    def expiry(self) -> datetime:
+        """Expiry date."""
+        return datetime.fromtimestamp(self.expires_at, timezone.utc)
+
+    def ttl(self) -> float:
+        """Return the number of seconds the signed URL is still valid for."""
+        return self.expires_at - time.time()
+
+    def __eq__(self, other) -> bool:
+        """Whether two entries have the same signed URL and expiry."""
+        if not isinstance(other, CachedSignedURL):
+            return NotImplemented
+        return (self.href, self.expires_at) == (other.href, other.expires_at)
+
+    def __repr__(self) -> str:
+        """Representation."""
+        return f"CachedSignedURL(href={self.href!r}, expiry={self.expiry})"
+
+
+class MemoryCache(MutableMapping):
+    """In-memory signed URLs cache, bounded in entries and in bytes.
+
+    Entries are evicted in least-recently-used order when the cache is full.
+    Expired entries are evicted proactively, in order of expiry. Hits,
+    misses, and evictions are counted (see `stats()`).
+    Entries are stored as `CachedSignedURL`, which are returned by lookups.
+    The cache is thread-safe.
+    """
+
+    def __init__(self, max_entries: int | None = None, max_bytes: int | None = None):
+        """Initialize the cache.
+
+        Args:
+            max_entries: maximum number of entries (default:
+                `ENV.tld_cache_max_entries`)
+            max_bytes: approximate maximum size in bytes (default:
+                `ENV.tld_cache_max_bytes`)
+
+        """
+        self.max_entries = max_entries or ENV.tld_cache_max_entries
+        self.max_bytes = max_bytes or ENV.tld_cache_max_bytes
+        self._entries: OrderedDict[str, CachedSignedURL] = OrderedDict()
+        # Keys by expiry, and heap of the expiries
+        self._expiries: Dict[int, list[str]] = {}
+        self._expiry_heap: list[int] = []
+        self._n_expiry_keys = 0
+        self._lock = threading.RLock()
+        self.n_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _size(key: str, entry: CachedSignedURL) -> int:
+        """Approximate size of an entry."""
+        return len(key) + len(entry.signature) + MEMORY_CACHE_ENTRY_OVERHEAD
+
+    def _add_expiry(self, key: str, expires_at: int):
+        """Record the expiry of an entry (the lock must be held)."""
+        if (keys := self._expiries.get(expires_at)) is None:
+            keys = self._expiries[expires_at] = []
+            heapq.heappush(self._expiry_heap, expires_at)
+        keys.append(key)
+        self._n_expiry_keys += 1
+
+    def _remove(self, key: str):
+        """Remove an entry (the lock must be held)."""
+        entry = self._entries.pop(key)
+        self.n_bytes -= self._size(key, entry)
+
+    def _evict(self):
+        """Evict expired entries, then least recently used ones."""
+        now = time.time()
+        while self._expiry_heap and self._expiry_heap[0] <= now:
+            expires_at = heapq.heappop(self._expiry_heap)
+            keys = self._expiries.pop(expires_at)
+            self._n_expiry_keys -= len(keys)
+            for key in keys:
+                entry = self._entries.get(key)
+                # Skip the keys of entries that were replaced since
+                if entry and entry.expires_at == expires_at:
+                    self._remove(key)
+                    self.expirations += 1
+        while len(self._entries) > self.max_entries or self.n_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+        if self._n_expiry_keys > 2 * len(self._entries) + 1024:
+            # Drop the keys of replaced or evicted entries
+            self._expiries.clear()
+            self._expiry_heap.clear()
+            self._n_expiry_keys = 0
+            for key, entry in self._entries.items():
+                self._add_expiry(key, entry.expires_at)
+
+    def get(self, key, default=None):
+        """Return the entry if it has not expired, else `default`."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry.expires_at <= time.time():
+                self._remove(key)
+                self.misses += 1
+                self.expirations += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def __getitem__(self, key: str) -> CachedSignedURL:
+        """Return the entry if it has not expired."""
+        entry = self.get(key)
+        if entry is None:
+            raise KeyError(key)
+        return entry
+
+    def _set(self, key: str, entry: CacheEntry):
+        """Add or replace an entry, without eviction (the lock must be held)."""
+        entry = CachedSignedURL.from_entry(key, entry)
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self.n_bytes += self._size(key, entry)
+        self._add_expiry(key, entry.expires_at)
+
+    def __setitem__(self, key: str, entry: CacheEntry):
+        """Add or replace an entry."""
+        with self._lock:
+            self._set(key, entry)
+            self._evict()
+
+    def update(self, entries=(), /, **kwargs):  # pylint: disable = W0221
+        """Add or replace entries, evicting once for all."""
+        items = entries.items() if isinstance(entries, Mapping) else entries
+        with self._lock:
+            for key, entry in items:
+                self._set(key, entry)
+            for key, entry in kwargs.items():
+                self._set(key, entry)
+            self._evict()
+
+    def __delitem__(self, key: str):
+        """Remove an entry."""
+        with self._lock:
+            self._remove(key)
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over a snapshot of the keys."""
+        with self._lock:
+            return iter(list(self._entries))
+
+    def __len__(self) -> int:
+        """Number of entries."""
+        return len(self._entries)
+
+    def __contains__(self, key) -> bool:
+        """Whether the key is cached (expired or not), without counting a hit."""
+        return key in self._entries
+
+    def clear(self):
+        """Remove all entries (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self._expiries.clear()
+            self._expiry_heap.clear()
+            self._n_expiry_keys = 0
+            self.n_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Return the counters of the cache."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.n_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class DiskCache:
+    """Signed URLs cache stored in a SQLite database, shared by processes.
+
+    The database is opened in WAL mode, so that readers never block writers
+    (and conversely). Each thread (and each process) uses its own
+    connection. WAL relies on shared memory: the processes must run on
+    the same host, and the database must be on a local file system (not
+    NFS). Entries are evicted once they are within `ENV.tld_ttl_margin`
+    seconds of their expiry.
+    Errors are logged and otherwise ignored: the disk cache is best-effort.
+    """
+
+    def __init__(self, path: str):
+        """Initialize the cache.
+
+        Args:
+            path: path of the SQLite database file
+
+        """
+        self.path = path
+        self._local = threading.local()
+        self._last_eviction = 0.0
+        self._execute(
+            "CREATE TABLE IF NOT EXISTS signed_urls ("
+            "href TEXT PRIMARY KEY, signed_href TEXT NOT NULL, expiry REAL NOT NULL)"
+        )
+        self._execute(
+            "CREATE INDEX IF NOT EXISTS signed_urls_expiry ON signed_urls(expiry)"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return the connection of the current thread and process."""
+        # Connections must not be shared with forked processes
+        if getattr(self._local, "pid", None) != os.getpid():
+            log.debug("Opening disk cache %s", self.path)
+            conn = sqlite3.connect(
+                self.path, timeout=DISK_CACHE_TIMEOUT, isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def _execute(self, sql: str, params: Iterable = ()) -> list:
+        """Execute a statement and return the fetched rows."""
+        try:
+            return self._connect().execute(sql, tuple(params)).fetchall()
+        except sqlite3.Error as err:
+            log.warning("Unable to use disk cache %s (%s)", self.path, err)
+            return []
+
+    def get_many(self, urls: list[str]) -> Dict[str, Tuple[str, float]]:
+        """Get the cached entries that are not too close to expiring.
+
+        Args:
+            urls: URLs to look up
+
+        Returns:
+            dict: key = URL, value = (signed URL, expiry as a POSIX timestamp)
+
+        """
+        min_expiry = time.time() + ENV.tld_ttl_margin
+        found = {}
+        for start in range(0, len(urls), DISK_CACHE_MAX_PARAMS):
+            chunk = urls[start : start + DISK_CACHE_MAX_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._execute(
+                "SELECT href, signed_href, expiry FROM signed_urls "
+                f"WHERE href IN ({placeholders}) AND expiry > ?",
+                [*chunk, min_expiry],
+            )
+            found.update({href: (signed, expiry) for href, signed, expiry in rows})
+        log.debug("Found %s/%s URLs in disk cache", len(found), len(urls))
+        return found
+
+    def put_many(self, entries: Dict[str, Tuple[str, float]]):
+        """Store entries.
+
+        Args:
+            entries: key = URL, value = (signed URL, expiry as a POSIX timestamp)
+
+        """
+        try:
+            conn = self._connect()
+            # Single transaction (connections are in autocommit mode)
+            conn.execute("BEGIN IMMEDIATE")
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO signed_urls VALUES (?, ?, ?)",
+                    [(url, *entry) for url, entry in entries.items()],
+                )
+        except sqlite3.Error as err:
+            log.warning("Unable to write disk cache %s (%s)", self.path, err)
+        if time.time() - self._last_eviction > DISK_CACHE_EVICTION_PERIOD:
+            self.evict()
+
+    def evict(self):
+        """Remove the entries that are too close to expiring."""
+        self._last_eviction = time.time()
+        log.debug("Evicting expired entries from disk cache %s", self.path)
+        self._execute(
+            "DELETE FROM signed_urls WHERE expiry <= ?",
+            [time.time() + ENV.tld_ttl_margin],
+        )
+
+    def clear(self):
+        """Remove all entries."""
+        self._execute("DELETE FROM signed_urls")
+
+
+_DISK_CACHE_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _open_disk_cache(path: str) -> DiskCache:
+    """Return the disk cache stored in `path`, opened once."""
+    return DiskCache(path)
+
+
+def get_disk_cache() -> DiskCache | None:
+    """Return the disk cache of the local cache directory, if enabled.
+
+    The disk cache is enabled with `ENV.tld_disk_cache`, and stored in
+    `ENV.tld_disk_cache_dir` (default: the user cache directory).
+    """
+    if not ENV.tld_disk_cache:
+        return None
+    cache_path = get_cache_path()
+    if not cache_path:
+        return None  # pragma: no cover
+    path = os.path.join(cache_path, DISK_CACHE_FILE)
+    with _DISK_CACHE_LOCK:
+        return _open_disk_cache(path)
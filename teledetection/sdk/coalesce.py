@@ -0,0 +1,122 @@
+"""Coalescing of individual URL signing requests into batches."""
+
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, Mapping
+
+from .logger import get_logger_for
+from .settings import ENV
+
+log = get_logger_for(__name__)
+
+
+class _Batch:  # pylint: disable = R0903
+    """URLs waiting to be signed together."""
+
+    def __init__(self):
+        """Initialize."""
+        self.futures: Dict[str, Future] = {}
+        self.taken = threading.Event()
+
+
+class SignCoalescer:
+    """Buffer individual URLs, and sign them together in a single batch.
+
+    The first URL submitted to an empty batch starts a time window. The batch
+    is sent when the window is over, or as soon as it holds `max_size` URLs.
+    Unless given, they are read from `ENV.tld_coalesce_window` and
+    `ENV.tld_max_urls` at each submission.
+    The thread that submitted the first URL (or the last one, if the batch is
+    full) sends the batch: no background thread is involved.
+    """
+
+    def __init__(
+        self,
+        sign_batch: Callable[[list[str]], Mapping[str, str]],
+        window: float | None = None,
+        max_size: int | None = None,
+    ):
+        """Initialize.
+
+        Args:
+            sign_batch: function signing a list of URLs, returning a mapping
+                with original URLs as keys and signed URLs as values
+            window: time window (seconds) to wait for other URLs (default:
+                `ENV.tld_coalesce_window`)
+            max_size: maximum number of URLs in a batch (default:
+                `ENV.tld_max_urls`)
+
+        """
+        self.sign_batch = sign_batch
+        self.window = window
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._batch = _Batch()
+
+    def _take(self, batch: _Batch) -> bool:
+        """Take the batch if still open, so that no other URL is added to it.
+
+        The lock must be held.
+        """
+        if batch is not self._batch:
+            return False
+        self._batch = _Batch()
+        batch.taken.set()
+        return True
+
+    def _send(self, batch: _Batch):
+        """Sign the URLs of a batch, and set the result of their futures."""
+        log.debug("Sending a batch of %s coalesced URLs", len(batch.futures))
+        try:
+            signed_urls = self.sign_batch(list(batch.futures))
+            for url, future in batch.futures.items():
+                future.set_result(signed_urls[url])
+        except BaseException as err:
+            for future in batch.futures.values():
+                if not future.done():
+                    future.set_exception(err)
+            raise
+
+    def submit(self, urls: list[str]) -> Dict[str, Future]:
+        """Submit URLs to sign, and send the batch if needed.
+
+        Args:
+            urls: URLs to sign
+
+        Returns:
+            dict of futures: key = URL, value = future of the signed URL
+
+        """
+        window = ENV.tld_coalesce_window if self.window is None else self.window
+        max_size = ENV.tld_max_urls if self.max_size is None else self.max_size
+        futures = {}
+        to_send = []
+        leader = None
+        with self._lock:
+            for url in urls:
+                batch = self._batch
+                if not batch.futures:
+                    leader = batch
+                futures[url] = batch.futures.setdefault(url, Future())
+                if len(batch.futures) >= max_size and self._take(batch):
+                    to_send.append(batch)
+        for batch in to_send:
+            self._send(batch)
+        if leader and not leader.taken.wait(window):
+            with self._lock:
+                taken = self._take(leader)
+            if taken:
+                self._send(leader)
+        return futures
+
+    def sign(self, urls: list[str]) -> Dict[str, str]:
+        """Sign URLs together with the URLs submitted by other threads.
+
+        Args:
+            urls: URLs to sign
+
+        Returns:
+            dict of signed HREF: key = original URL, value = signed URL
+
+        """
+        return {url: future.result() for url, future in self.submit(urls).items()}
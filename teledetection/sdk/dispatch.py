@@ -0,0 +1,274 @@
+"""Requests to the signing endpoint.
+
+URLs are sent in chunks, concurrently, behind a circuit breaker. When the
+endpoint fails, still valid signed URLs can be served instead.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Dict, Mapping, cast
+
+from pydantic import BaseModel, ConfigDict  # pylint: disable = no-name-in-module
+
+from .batching import BatchSizer
+from .breaker import CircuitBreaker, SigningUnavailable
+from .cache import CacheEntry, CachedSignedURL
+from .expiry import _parse_signed_url_expiry
+from .http import session
+from .logger import get_logger_for
+from .metrics import SIGNING_STALE_URLS, record_signing_request
+from .settings import ENV
+
+log = get_logger_for(__name__)
+
+# Number of URLs per signing request (adaptive when `ENV.tld_adaptive_batch`)
+BATCH_SIZER = BatchSizer()
+
+# Circuit breaker of the signing endpoint
+BREAKER = CircuitBreaker()
+
+
+class SignURLRoute(Enum):
+    """Different routes used for sign_urls."""
+
+    SIGN_URLS_GET = "sign_urls"
+    SIGN_URLS_PUT = "sign_urls_put"
+
+
+class URLBase(BaseModel):  # pylint: disable = R0903
+    """Base model for responses."""
+
+    model_config = ConfigDict(populate_by_name=True)
+    expiry: datetime
+
+
+class SignedURLBatch(URLBase):  # pylint: disable = R0903
+    """Signed URLs (batch of URLs) response."""
+
+    hrefs: dict
+
+
+def _signing_params(urls: list[str]) -> Dict[str, Any]:
+    """Payload of a signing request."""
+    params: Dict[str, Any] = {"urls": urls}
+    if ENV.tld_url_duration:
+        params["duration_seconds"] = ENV.tld_url_duration
+    return params
+
+
+def _parse_signed_url_batch(payload: Any, urls: list[str]) -> SignedURLBatch:
+    """Parse and check the response to a signing request.
+
+    Args:
+        payload: JSON response
+        urls: urls that were sent
+
+    Returns:
+        SignedURLBatch: the signed URLs
+
+    """
+    signed_url_batch = SignedURLBatch(**payload)
+    if not signed_url_batch:
+        raise ValueError(f"No signed url batch found in response: {payload}")
+    if not all(key in signed_url_batch.hrefs for key in urls):
+        raise ValueError(
+            f"URLs to sign are {urls} but returned "
+            f"signed URLs"
+            f"are for {signed_url_batch.hrefs.keys()}"
+        )
+    return signed_url_batch
+
+
+def _request_recorder(
+    route: SignURLRoute, n_urls: int
+) -> Callable[[float, bool], None]:
+    """Return the function recording the round trip of a signing request.
+
+    The latency feeds the metrics and the adaptive batch size: it must not
+    include the rate limiting waits, nor the pauses after a 429.
+
+    Args:
+        route: route (API)
+        n_urls: number of URLs in the request
+
+    """
+
+    def _record(latency: float, success: bool):
+        record_signing_request(route.value, n_urls, latency, success)
+        BATCH_SIZER.record(n_urls, latency, success)
+
+    return _record
+
+
+def _sign_chunk(
+    urls: list[str], route: SignURLRoute, auth_headers: Dict[str, str]
+) -> SignedURLBatch:
+    """Sign one chunk of URLs with a single request to the signing endpoint.
+
+    Args:
+        urls: urls (at most `ENV.tld_max_urls`)
+        route: route (API)
+        auth_headers: authentication headers
+
+    Returns:
+        SignedURLBatch: the signed URLs of the chunk
+
+    """
+    with BREAKER.guard():
+        response = session.post(
+            route=route.value,
+            params=_signing_params(urls),
+            auth_headers=auth_headers,
+            record=_request_recorder(route, len(urls)),
+        )
+        return _parse_signed_url_batch(response.json(), urls)
+
+
+def _failed_chunks(
+    errors: Mapping[int, BaseException], n_chunks: int, attempt: int
+) -> list[int]:
+    """Return the chunks to send again after an attempt.
+
+    Args:
+        errors: errors of the failed chunks, by chunk index
+        n_chunks: total number of chunks
+        attempt: number of attempts so far, minus one
+
+    Returns:
+        the indices of the failed chunks (empty if none failed)
+
+    Raises:
+        SigningUnavailable: when chunks failed and the circuit breaker is open
+        Exception: the error of the first failed chunk, after the last attempt
+
+    """
+    pending = sorted(errors)
+    if not pending:
+        return pending
+    if BREAKER.is_open:
+        raise SigningUnavailable(
+            f"{len(pending)} chunk(s) out of {n_chunks} failed"
+        ) from errors[pending[0]]
+    if attempt == ENV.tld_signing_chunk_retries:
+        raise errors[pending[0]]
+    log.warning(
+        "Retrying %s failed chunk(s) out of %s (%s)",
+        len(pending),
+        n_chunks,
+        errors[pending[0]],
+    )
+    return pending
+
+
+def _dispatch_chunks(
+    chunks: list[list[str]], route: SignURLRoute
+) -> list[SignedURLBatch]:
+    """Sign chunks of URLs, with at most `ENV.tld_signing_workers` in flight.
+
+    Chunks are sent concurrently over the shared HTTP session. Only the
+    chunks that failed are sent again, up to `ENV.tld_signing_chunk_retries`
+    times (unless the circuit breaker is open), after which the last error
+    is raised.
+
+    Args:
+        chunks: chunks of urls
+        route: route (API)
+
+    Returns:
+        the signed URL batches, in the same order as `chunks`
+
+    """
+    results: list[SignedURLBatch | None] = [None] * len(chunks)
+    pending = list(range(len(chunks)))
+    # Getting the headers may refresh the OAuth2 token: this is done once for
+    # all the chunks, before the worker threads start
+    auth_headers = session.get_method().get_headers()
+    for attempt in range(ENV.tld_signing_chunk_retries + 1):
+        errors: Dict[int, Exception] = {}
+        n_workers = min(ENV.tld_signing_workers, len(pending))
+        if n_workers <= 1:
+            for i_chunk in pending:
+                log.debug("Processing chunk %s/%s", i_chunk + 1, len(chunks))
+                try:
+                    results[i_chunk] = _sign_chunk(
+                        chunks[i_chunk], route, auth_headers
+                    )
+                except Exception as err:
+                    errors[i_chunk] = err
+        else:
+            log.debug("Processing %s chunks with %s workers", len(pending), n_workers)
+            with ThreadPoolExecutor(max_workers=n_workers) as executor:
+                futures = {
+                    i_chunk: executor.submit(
+                        _sign_chunk, chunks[i_chunk], route, auth_headers
+                    )
+                    for i_chunk in pending
+                }
+                for i_chunk, future in futures.items():
+                    try:
+                        results[i_chunk] = future.result()
+                    except Exception as err:
+                        errors[i_chunk] = err
+        if not (pending := _failed_chunks(errors, len(chunks), attempt)):
+            break
+
+    return cast(list[SignedURLBatch], results)
+
+
+def _make_chunks(urls: list[str]) -> list[list[str]]:
+    """Split URLs in chunks, sized by `BATCH_SIZER`."""
+    # The batch size adapts to the latency (with `ENV.tld_adaptive_batch`),
+    # and keeps the request bodies under `ENV.tld_max_request_bytes`
+    n_urls = len(urls)
+    batch_size = BATCH_SIZER.size(urls)
+    log.debug("Number of URLs to sign: %s", n_urls)
+    chunks = [
+        urls[chunk_start : chunk_start + batch_size]
+        for chunk_start in range(0, n_urls, batch_size)
+    ]
+    log.debug("Number of chunks of URLs to sign: %s", len(chunks))
+    return chunks
+
+
+def _serve_stale(
+    urls: list[str], err: Exception, cache: Mapping[str, CacheEntry]
+) -> Dict[str, CacheEntry]:
+    """Return still valid signed URLs, when the signing endpoint fails.
+
+    With `ENV.tld_serve_stale`, cached or already signed URLs past the TTL
+    margin are used as long as they are valid for more than
+    `ENV.tld_serve_stale_min_ttl` seconds.
+
+    Args:
+        urls: GET URLs that could not be signed
+        err: error of the signing
+        cache: cache of signed URLs
+
+    Returns:
+        dict of SignedURL: key = original URL, value = signed URL
+
+    Raises:
+        err: when disabled, or when some URLs have no valid signed URL
+
+    """
+    if not ENV.tld_serve_stale:
+        raise err
+    stale = {}
+    min_expiry = time.time() + ENV.tld_serve_stale_min_ttl
+    for url in urls:
+        if (signed_url := cache.get(url)) is None and (
+            expiry := _parse_signed_url_expiry(url)
+        ) is not None:
+            signed_url = CachedSignedURL(url, url, int(expiry.timestamp()))
+        if signed_url is None or signed_url.expires_at <= min_expiry:
+            raise err
+        stale[url] = signed_url
+    log.warning(
+        "Unable to sign URLs (%s), using %s signed URLs close to expiring",
+        err,
+        len(stale),
+    )
+    SIGNING_STALE_URLS.inc(amount=len(stale))
+    return stale
@@ -0,0 +1,143 @@
+"""Expiry of already signed URLs."""
+
+import re
+from datetime import datetime, timezone, timedelta
+from functools import lru_cache
+from urllib.parse import parse_qs, urlparse
+
+# Value of the `X-Amz-Date` parameter of signed URLs
+amz_date_xpr = re.compile(r"[0-9]{8}T[0-9]{6}Z")
+
+# Number of hrefs for which the expiry of already signed URLs is memoised
+SIGNED_URL_PARSE_CACHE_SIZE = 65536
+
+
+class NotSignedURL(Exception):
+    """The URL is not signed."""
+
+
+def _parse_signed_url_expiry_slow(signed_href: str) -> datetime:
+    """Return the expiry of an already signed URL, with a full query parse.
+
+    Raises:
+        NotSignedURL: when the URL has no valid `X-Amz-Date`/`X-Amz-Expires`
+
+    """
+    parsed_url = urlparse(signed_href.rstrip("/"))
+    parsed_qs = parse_qs(parsed_url.query)
+    parsed_date = parsed_qs.get("X-Amz-Date", [""])
+    parsed_expiry = parsed_qs.get("X-Amz-Expires", [""])
+
+    # Grab date
+    try:
+        parsed_datetime = datetime.strptime(
+            parsed_date[0], "%Y%m%dT%H%M%SZ"
+        ).replace(tzinfo=timezone.utc)
+    except ValueError as err:
+        raise NotSignedURL(f"Cannot parse date from URL {signed_href}") from err
+
+    # Grab expiry
+    try:
+        parsed_expiry_td = timedelta(seconds=int(parsed_expiry[0]))
+    except ValueError as err:
+        raise NotSignedURL(f"Cannot parse expiry from URL {signed_href}") from err
+
+    return parsed_datetime + parsed_expiry_td
+
+
+def _parse_signed_url_expiry_or_none(signed_href: str) -> datetime | None:
+    """Return the expiry of an already signed URL, or None if not signed."""
+    try:
+        return _parse_signed_url_expiry_slow(signed_href)
+    except NotSignedURL:
+        return None
+
+
+def _scan_amz_params(href: str) -> tuple[str | None, str | None] | None:
+    """Return the first `X-Amz-Date` and `X-Amz-Expires` values of a query.
+
+    Args:
+        href: URL, without trailing slashes
+
+    Returns:
+        the values (None when missing), or None if the query has encoded
+        characters and needs a full parse
+
+    """
+    date = expires = None
+    for field in href.partition("#")[0].partition("?")[2].split("&"):
+        name, sep, value = field.partition("=")
+        if "%" in name:
+            return None
+        if not sep or not value or name not in ("X-Amz-Date", "X-Amz-Expires"):
+            continue
+        if "%" in value or "+" in value:
+            return None
+        if name == "X-Amz-Date":
+            date = value if date is None else date
+        elif expires is None:
+            expires = value
+    return date, expires
+
+
+def _amz_expiry(date: str, expires: str) -> datetime | None:
+    """Return the expiry from `X-Amz-Date` and `X-Amz-Expires` values.
+
+    Args:
+        date: `X-Amz-Date` value
+        expires: `X-Amz-Expires` value
+
+    Returns:
+        expiry, or None if the values are not in their strict format and need
+        a full parse
+
+    """
+    if not amz_date_xpr.fullmatch(date):
+        return None
+    if not (expires.isascii() and expires.isdigit()):
+        return None
+    try:
+        parsed_datetime = datetime(
+            int(date[:4]),
+            int(date[4:6]),
+            int(date[6:8]),
+            int(date[9:11]),
+            int(date[11:13]),
+            int(date[13:15]),
+            tzinfo=timezone.utc,
+        )
+    except ValueError:
+        return None
+    return parsed_datetime + timedelta(seconds=int(expires))
+
+
+@lru_cache(maxsize=SIGNED_URL_PARSE_CACHE_SIZE)
+def _parse_signed_url_expiry(signed_href: str) -> datetime | None:
+    """Return the expiry of an already signed URL, or None if not signed.
+
+    The query is scanned for `X-Amz-Date` and `X-Amz-Expires` without a full
+    parse, and without raising for plain URLs. Unusual URLs (whitespace,
+    percent-encoded parameters, loose date formats...) go through
+    :func:`_parse_signed_url_expiry_slow`, so that the result is always the
+    same as with `urlparse` and `parse_qs`.
+
+    Args:
+        signed_href: URL
+
+    Returns:
+        expiry of the signed URL, or None if the URL is not signed
+
+    """
+    if "X-Amz-" not in signed_href and "%" not in signed_href:
+        return None
+    href = signed_href.rstrip("/")
+    if " " in href or not href.isprintable():
+        return _parse_signed_url_expiry_or_none(signed_href)
+    if (params := _scan_amz_params(href)) is None:
+        return _parse_signed_url_expiry_or_none(signed_href)
+    date, expires = params
+    if date is None or expires is None:
+        return None
+    return _amz_expiry(date, expires) or _parse_signed_url_expiry_or_none(
+        signed_href
+    )
@@ -1,12 +1,30 @@
 """Work on files to update signed HREFs that may have expired."""
 
+import copy
 import os
+import struct
 import tempfile
 import shutil
 import re
-import glob
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import copy_context
+from typing import IO, Callable, Dict, Iterator
+from .expiry import _parse_signed_url_expiry
 from .logger import get_logger_for
-from .signing import sign_string
+from .settings import ENV
+from .signing import (
+    SIGN_URLS_OVERRIDE,
+    VRT_AMP_STR,
+    SignURLRoute,
+    _generic_sign_urls,
+    _is_storage_url,
+    asset_xpr,
+    sign_urls,
+    sign_vrt_string,
+)
 
 
 log = get_logger_for(__name__)
@@ -19,48 +37,389 @@ URL_RE = (
 AMP_STR_E = "&amp;"
 AMP_STR = "&"
 
+# Characters that no `URL_RE` match can contain (except right after "://")
+URL_SEPARATORS = "\n\t \"'<>{}()[],"
+
+# Offsets of the name and extra field lengths in a zip local file header
+ZIP_LOCAL_HEADER = struct.Struct("<26xHH")
+ZIP_EXTRA_HEADER = struct.Struct("<HH")
+ZIP64_EXTRA_ID = 1
+ZIP_COPY_CHUNK_SIZE = 1024 * 1024
+
+# Number of characters read at once when streaming a file
+FILE_CHUNK_SIZE = 8 * 1024 * 1024
+VRT_CHUNK_SIZE = FILE_CHUNK_SIZE
+
+# Extensions of the files signed by `update_hrefs_in_dir`
+SIGNABLE_EXTENSIONS = (".vrt", ".qgs", ".qgz", ".json")
+
 
 def update_href_in_string(contents: str, amp: bool) -> str:
-    """Return the string with HREFs updated (signed)."""
+    """Return the string with HREFs updated (signed).
+
+    All the URLs are collected first, then signed together (in chunks), and
+    finally replaced in a single pass.
+    """
     log.debug("Original contents: %s, ampersand: %s", contents, amp)
+    matches = list(re.finditer(URL_RE, contents))
+    if not matches:
+        return contents
+
+    # QGIS typically save signed URLs replacing "&" with "&amp;"
+    urls = {
+        found: found.replace(AMP_STR_E, AMP_STR) if amp else found
+        for found in dict.fromkeys(match.group() for match in matches)
+    }
+    log.debug("Signing %s URLs", len(urls))
+    signed_urls = sign_urls(list(dict.fromkeys(urls.values())))
+    replacements = {
+        found: (
+            signed_urls[url].replace(AMP_STR, AMP_STR_E) if amp else signed_urls[url]
+        )
+        for found, url in urls.items()
+    }
+
+    pieces = []
+    pos = 0
+    for match in matches:
+        pieces.append(contents[pos : match.start()])
+        pieces.append(replacements[match.group()])
+        pos = match.end()
+    pieces.append(contents[pos:])
+    return "".join(pieces)
+
+
+@contextmanager
+def _atomic_output(filepath: str, mode: str = "w") -> Iterator[IO]:
+    """Open a temporary file, that replaces `filepath` once fully written.
+
+    The temporary file is in the same directory, so that the replacement is
+    atomic: `filepath` is never left half written.
+    """
+    dirname = os.path.dirname(os.path.abspath(filepath))
+    fd, tmp_path = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+    encoding = None if "b" in mode else "utf8"
+    try:
+        with os.fdopen(fd, mode, encoding=encoding) as file_handle:
+            yield file_handle
+        if os.path.exists(filepath):
+            shutil.copymode(filepath, tmp_path)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _url_boundary(contents: str) -> int:
+    """Return the last position in the contents that no URL can span.
+
+    Returns:
+        position of the last separator that can't be part of a `URL_RE`
+        match, or -1 if there is none
+
+    """
+    end = len(contents)
+    while (pos := max(contents.rfind(char, 0, end) for char in URL_SEPARATORS)) > 0:
+        # The character following "://" can be anything
+        if contents[max(pos - 3, 0) : pos] != "://":
+            return pos
+        end = pos
+    return pos
 
-    def _sign_url(_in: str) -> str:
-        """Sign an URL."""
-        # QGIS typically save signed URLs replacing "&" with "&amp;"
-        log.debug("signing URL %s", _in)
-        _out = sign_string(url=_in.replace(AMP_STR_E, AMP_STR) if amp else _in)
-        ret = _out.replace(AMP_STR, AMP_STR_E) if amp else _out
-        log.debug("signed URL %s", _out)
 
-        return ret
+def _iter_windows(
+    file_handle: IO[str], boundary: Callable[[str], int], chunk_size: int
+) -> Iterator[str]:
+    """Read a text file by windows that no URL spans.
 
-    return re.sub(URL_RE, lambda x: _sign_url(x.group()), contents)
+    Args:
+        file_handle: text file
+        boundary: function returning where a window can be cut (<= 0 if not)
+        chunk_size: number of characters read at once
+
+    """
+    pending = ""
+    while chunk := file_handle.read(chunk_size):
+        pending += chunk
+        if (cut := boundary(pending)) > 0:
+            yield pending[:cut]
+            pending = pending[cut:]
+    yield pending
+
+
+def _stream_text(
+    src: str,
+    dst: str,
+    sign_window: Callable[[str], str],
+    boundary: Callable[[str], int],
+    chunk_size: int,
+):
+    """Sign a text file window by window, with constant memory.
+
+    The file is read by chunks of `chunk_size` characters. Each chunk is cut
+    at the position returned by `boundary`, so that no URL spans two windows,
+    and the rest is carried over to the next window.
+
+    Args:
+        src: input file
+        dst: output file, written atomically (can be `src`)
+        sign_window: function returning a window with its URLs signed
+        boundary: function returning where a window can be cut (<= 0 if not)
+        chunk_size: number of characters read at once
+
+    """
+    with _atomic_output(dst) as dst_handle:
+        with open(src, "r", encoding="utf8") as src_handle:
+            for window in _iter_windows(src_handle, boundary, chunk_size):
+                dst_handle.write(sign_window(window))
 
 
 def update_hrefs_in_file(filepath: str, amp: bool = False):
-    """Sign all HREFs in the provided file (modified in place)."""
-    log.debug("Reading file %s as text data", filepath)
-    with open(filepath, "r", encoding="utf8") as file_handle:
-        contents = update_href_in_string(contents=file_handle.read(), amp=amp)
-        log.debug("Updated contents: %s", contents)
-    log.debug("Writing file %s as text data", filepath)
-    with open(filepath, "w", encoding="utf8") as file_handle:
-        file_handle.write(contents)
+    """Sign all HREFs in the provided file (modified in place).
+
+    The file is streamed with constant memory, by windows of about
+    `FILE_CHUNK_SIZE` characters whose URLs are signed in a single batch.
+    The file is replaced atomically once fully written.
+    """
+    log.debug("Signing HREFs in file %s", filepath)
+    _stream_text(
+        src=filepath,
+        dst=filepath,
+        sign_window=lambda contents: update_href_in_string(contents, amp=amp),
+        boundary=_url_boundary,
+        chunk_size=FILE_CHUNK_SIZE,
+    )
+
+
+def _copy_raw_zip_entry(
+    src_handle: IO[bytes], zout: zipfile.ZipFile, info: zipfile.ZipInfo
+):
+    """Copy an entry to a zip archive, as raw compressed bytes.
+
+    Args:
+        src_handle: source zip archive, opened in binary mode
+        zout: destination zip archive
+        info: entry of the source archive
+
+    zipfile has no public API to add compressed bytes: this relies on the
+    attributes of `ZipFile` and `ZipInfo` used by `ZipFile.writestr`, which
+    are the same in all the supported Python versions (3.9 to 3.13).
+
+    """
+    fp = zout.fp
+    assert fp is not None, "The zip archive is closed"
+    src_handle.seek(info.header_offset)
+    name_length, extra_length = ZIP_LOCAL_HEADER.unpack(src_handle.read(30))
+    src_handle.seek(name_length + extra_length, os.SEEK_CUR)
+
+    new_info = copy.copy(info)
+    new_info.header_offset = fp.tell()
+    # Sizes are known: no data descriptor after the data
+    new_info.flag_bits &= ~0x08
+    # The zip64 extra field is written again by FileHeader() when needed
+    new_info.extra = _strip_zip_extra(info.extra, ZIP64_EXTRA_ID)
+    fp.write(new_info.FileHeader())
+    remaining = info.compress_size
+    while remaining:
+        data = src_handle.read(min(remaining, ZIP_COPY_CHUNK_SIZE))
+        if not data:
+            raise zipfile.BadZipFile(f"Truncated entry {info.filename}")
+        fp.write(data)
+        remaining -= len(data)
+    zout.filelist.append(new_info)
+    zout.NameToInfo[new_info.filename] = new_info
+    zout.start_dir = fp.tell()  # type: ignore[attr-defined]
+    zout._didModify = True  # type: ignore[attr-defined]  # pylint: disable=W0212
+
+
+def _strip_zip_extra(extra: bytes, header_id: int) -> bytes:
+    """Remove the fields with the given header ID from a zip extra field."""
+    fields = []
+    offset = 0
+    while offset + ZIP_EXTRA_HEADER.size <= len(extra):
+        field_id, size = ZIP_EXTRA_HEADER.unpack_from(extra, offset)
+        end = offset + ZIP_EXTRA_HEADER.size + size
+        if field_id != header_id:
+            fields.append(extra[offset:end])
+        offset = end
+    return b"".join(fields)
 
 
 def update_hrefs_in_qgz(filepath: str):
-    """Sign all HREFs in the QGIS project file (modified in place)."""
+    """Sign all HREFs in the QGIS project file (modified in place).
+
+    Only the project (.qgs) is decompressed, signed and compressed again.
+    Other entries (auxiliary databases, attachments...) are copied as raw
+    compressed bytes.
+    """
     assert filepath.lower().endswith(".qgz"), "The QGIS project must be a .qgz file"
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        log.debug("Using temporary directory %s", tmpdir)
-        log.debug("Decompressing QGIS project %s to %s", filepath, tmpdir)
-        shutil.unpack_archive(filename=filepath, extract_dir=tmpdir, format="zip")
-        extracted = glob.glob(os.path.join(tmpdir, "**/*"), recursive=True)
-        log.debug("Extracted files: %s", "\n\t- ".join([] + extracted))
-        matches = [file for file in extracted if file.lower().endswith(".qgs")]
-        assert len(matches) == 1, f"Unable to read the QGIS project {filepath}"
-        update_hrefs_in_file(filepath=matches[0], amp=True)
-        log.debug("Replacing original QGIS project file")
-        shutil.make_archive(filepath, format="zip", root_dir=tmpdir)
-        shutil.move(f"{filepath}.zip", filepath)
+    with _atomic_output(filepath, mode="wb") as dst_handle:
+        with zipfile.ZipFile(filepath) as zin, open(filepath, "rb") as src_handle:
+            infos = zin.infolist()
+            log.debug("Entries: %s", "\n\t- ".join(i.filename for i in infos))
+            matches = [i for i in infos if i.filename.lower().endswith(".qgs")]
+            assert len(matches) == 1, f"Unable to read the QGIS project {filepath}"
+            with zipfile.ZipFile(dst_handle, "w") as zout:
+                zout.comment = zin.comment
+                for info in infos:
+                    if info is not matches[0]:
+                        _copy_raw_zip_entry(src_handle, zout, info)
+                        continue
+                    log.debug("Signing HREFs in %s", info.filename)
+                    contents = update_href_in_string(
+                        contents=zin.read(info).decode("utf8"), amp=True
+                    )
+                    new_info = zipfile.ZipInfo(info.filename, info.date_time)
+                    new_info.compress_type = info.compress_type
+                    new_info.external_attr = info.external_attr
+                    new_info.comment = info.comment
+                    zout.writestr(new_info, contents.encode("utf8"))
+    log.debug("QGIS project %s updated", filepath)
+
+
+def sign_vrt_file(src: str, dst: str | None = None):
+    """Sign all URLs from the storage in a VRT file, with constant memory.
+
+    The VRT is read by chunks of `VRT_CHUNK_SIZE` characters, cut before the
+    last "<" so that no URL spans two chunks. The URLs of each chunk are signed
+    in a single batch, and the chunk is written right away.
+
+    Args:
+        src: input VRT file
+        dst: output VRT file. When not provided, `src` is modified in place.
+
+    """
+    log.debug("Signing VRT file %s to %s", src, dst or src)
+    _stream_text(
+        src=src,
+        dst=dst or src,
+        sign_window=sign_vrt_string,
+        boundary=lambda contents: contents.rfind("<"),
+        chunk_size=VRT_CHUNK_SIZE,
+    )
+
+
+def _find_urls(filepath: str) -> list[str]:
+    """Return the URLs of a file, as they are passed to `sign_urls`.
+
+    Args:
+        filepath: VRT, QGIS project (.qgs or .qgz) or JSON file
+
+    """
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext == ".qgz":
+        with zipfile.ZipFile(filepath) as zin:
+            names = [n for n in zin.namelist() if n.lower().endswith(".qgs")]
+            assert len(names) == 1, f"Unable to read the QGIS project {filepath}"
+            windows: Iterator[str] = iter([zin.read(names[0]).decode("utf8")])
+            return _find_urls_in_windows(windows, URL_RE, escaped_amp=AMP_STR_E)
+    with open(filepath, "r", encoding="utf8") as file_handle:
+        if ext == ".vrt":
+            windows = _iter_windows(
+                file_handle, lambda contents: contents.rfind("<"), VRT_CHUNK_SIZE
+            )
+            return _find_urls_in_windows(windows, asset_xpr, escaped_amp=VRT_AMP_STR)
+        windows = _iter_windows(file_handle, _url_boundary, FILE_CHUNK_SIZE)
+        escaped_amp = AMP_STR_E if ext == ".qgs" else None
+        return _find_urls_in_windows(windows, URL_RE, escaped_amp=escaped_amp)
+
+
+def _find_urls_in_windows(
+    windows: Iterator[str], xpr: str | re.Pattern, escaped_amp: str | None
+) -> list[str]:
+    """Return the distinct URLs matching the expression in the windows.
+
+    Args:
+        windows: text windows
+        xpr: regular expression matching URLs
+        escaped_amp: how "&" is escaped in the text, if it is
+
+    """
+    urls: Dict[str, None] = {}
+    for window in windows:
+        for match in re.finditer(xpr, window):
+            url = match.group()
+            urls[url.replace(escaped_amp, AMP_STR) if escaped_amp else url] = None
+    return list(urls)
+
+
+def _needs_signing(urls: list[str]) -> bool:
+    """Whether some storage URLs are not signed, or will soon expire."""
+    min_expiry = time.time() + ENV.tld_ttl_margin
+    for url in urls:
+        if not _is_storage_url(url):
+            continue
+        expiry = _parse_signed_url_expiry(url)
+        if expiry is None or expiry.timestamp() < min_expiry:
+            return True
+    return False
+
+
+def _update_hrefs_in_any_file(filepath: str):
+    """Sign all HREFs in a VRT, QGIS project or JSON file (modified in place)."""
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext == ".qgz":
+        update_hrefs_in_qgz(filepath)
+    elif ext == ".vrt":
+        sign_vrt_file(filepath)
+    else:
+        update_hrefs_in_file(filepath, amp=ext == ".qgs")
+
+
+def update_hrefs_in_dir(dirpath: str, workers: int | None = None) -> list[str]:
+    """Sign all HREFs in the files of a directory (modified in place).
+
+    VRTs, QGIS projects (.qgs, .qgz) and JSON files (e.g. kerchunk) are
+    searched recursively. The URLs of all the files are signed together, in
+    shared batches, then the files are rewritten in parallel. Files whose
+    storage URLs are all signed, with more than `ENV.tld_ttl_margin` seconds
+    left, are not written.
+
+    Args:
+        dirpath: directory
+        workers: number of threads reading and writing files (defaults to
+            the `ThreadPoolExecutor` default)
+
+    Returns:
+        the updated files
+
+    """
+    filepaths = sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(dirpath)
+        for name in names
+        if name.lower().endswith(SIGNABLE_EXTENSIONS)
+    )
+    log.debug("Found %s files to sign in %s", len(filepaths), dirpath)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        urls_per_file = dict(zip(filepaths, executor.map(_find_urls, filepaths)))
+        to_update = [
+            filepath for filepath, urls in urls_per_file.items() if _needs_signing(urls)
+        ]
+        log.debug("%s files are still valid", len(filepaths) - len(to_update))
+        if not to_update:
+            return []
+
+        # Sign the URLs of all files at once, then serve them to each file
+        signed_hrefs = sign_urls(
+            list(dict.fromkeys(url for f in to_update for url in urls_per_file[f]))
+        )
+
+        def _sign_from_batch(urls: list[str]) -> Dict[str, str]:
+            """Sign URLs, using the URLs signed for all files."""
+            if missing := [url for url in urls if url not in signed_hrefs]:
+                signed_hrefs.update(
+                    _generic_sign_urls(missing, route=SignURLRoute.SIGN_URLS_GET)
+                )
+            return {url: signed_hrefs[url] for url in urls}
+
+        context = copy_context()
+        context.run(SIGN_URLS_OVERRIDE.set, _sign_from_batch)
+        futures = [
+            executor.submit(context.copy().run, _update_hrefs_in_any_file, filepath)
+            for filepath in to_update
+        ]
+        for future in futures:
+            future.result()
+    return to_update
@@ -0,0 +1,204 @@
+"""fsspec filesystem for the storage, with URLs signed lazily.
+
+Requires `fsspec` (`pip install teledetection[fsspec]`). The filesystem is
+registered under the `tld` protocol:
+
+    import fsspec
+    with fsspec.open("tld://<bucket>/<key>") as file_handle:
+        ...
+
+Storage URLs (`https://s3-data.meso.umontpellier.fr/<bucket>/<key>`) are
+accepted as paths too, so that kerchunk references can be read with
+`remote_protocol="tld"`.
+"""
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+try:
+    from fsspec.spec import AbstractBufferedFile, AbstractFileSystem  # type: ignore
+except ImportError as err:
+    raise ImportError(
+        "The fsspec filesystem requires fsspec. "
+        "To install it, use `pip install teledetection[fsspec]`"
+    ) from err
+
+import requests
+
+from .logger import get_logger_for
+from .settings import ENV, S3_STORAGE_DOMAIN
+from .signing import SignURLRoute, _generic_get_signed_urls
+from .storage import DEFAULT_STORAGE_ENDPOINT, StorageClient
+
+log = get_logger_for(__name__)
+
+DEFAULT_BLOCK_SIZE = 5 * 1024 * 1024
+
+# Storage URLs, that can be used as paths
+storage_url_xpr = re.compile(
+    rf"https?://[^/]*{re.escape(S3_STORAGE_DOMAIN)}(?::\d+)?/(?P<path>.*)"
+)
+
+
+class TeledetectionFileSystem(AbstractFileSystem):  # pylint: disable = W0223
+    """Read-only filesystem for the storage, signing URLs at open time.
+
+    URLs are signed through the SDK cache: they are signed again when close
+    to expiring, or when the storage denies access (403). Byte ranges are
+    fetched in parallel by `cat_ranges`, after signing all the URLs at once.
+    Listing directories is not supported.
+    """
+
+    protocol = "tld"
+    root_marker = ""
+
+    def __init__(
+        self,
+        storage_endpoint: str = DEFAULT_STORAGE_ENDPOINT,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        cache_type: str = "readahead",
+        max_workers: int | None = None,
+        **storage_options,
+    ):
+        """Initialize.
+
+        Args:
+            storage_endpoint: storage endpoint
+            block_size: size of the blocks read by opened files
+            cache_type: fsspec cache of opened files (e.g. "readahead",
+                "blockcache", "bytes", "none")
+            max_workers: number of ranges fetched in parallel by `cat_ranges`
+                (defaults to `ENV.tld_signing_workers`)
+            **storage_options: other fsspec options
+
+        """
+        super().__init__(**storage_options)
+        self.storage_endpoint = storage_endpoint.rstrip("/")
+        self.block_size = block_size
+        self.cache_type = cache_type
+        self.max_workers = max_workers or ENV.tld_signing_workers
+        self.client = StorageClient(pool_maxsize=max(10, self.max_workers))
+
+    @classmethod
+    def _strip_protocol(cls, path: Any) -> Any:
+        """Return the path without protocol (or storage endpoint)."""
+        if isinstance(path, list):
+            return [cls._strip_protocol(p) for p in path]
+        path = str(path)
+        if match := storage_url_xpr.match(path):
+            path = match.group("path")
+        elif path.startswith(f"{cls.protocol}://"):
+            path = path[len(cls.protocol) + 3 :]
+        return path.lstrip("/")
+
+    def url(self, path: str) -> str:
+        """Return the (unsigned) storage URL of a path."""
+        return f"{self.storage_endpoint}/{self._strip_protocol(path)}"
+
+    def _get(self, path: str, headers: dict | None = None) -> requests.Response:
+        """Send a GET request for a path, and check the response."""
+        response = self.client.request("GET", self.url(path), headers=headers)
+        if response.status_code == 404:
+            raise FileNotFoundError(path)
+        response.raise_for_status()
+        return response
+
+    def info(self, path, **kwargs):
+        """Return the size and type of a file.
+
+        URLs are signed for GET only: the size is read from the response to a
+        GET of the first byte.
+        """
+        response = self.client.head(self.url(path))
+        if response.status_code == 404:
+            raise FileNotFoundError(path)
+        response.raise_for_status()
+        return {
+            "name": self._strip_protocol(path),
+            "size": int(response.headers.get("Content-Length", 0)),
+            "type": "file",
+            "ETag": response.headers.get("ETag"),
+        }
+
+    def cat_file(self, path, start=None, end=None, **kwargs):
+        """Return the bytes of a file, or of a range of it."""
+        if (start is not None and start < 0) or (end is not None and end < 0):
+            size = self.size(path)
+            start = size + start if start is not None and start < 0 else start
+            end = size + end if end is not None and end < 0 else end
+        start = start or 0
+        if end is not None and end <= start:
+            return b""
+        headers = None
+        if start or end is not None:
+            last = "" if end is None else end - 1
+            headers = {"Range": f"bytes={start}-{last}"}
+        return self._get(path, headers=headers).content
+
+    def cat_ranges(
+        self, paths, starts, ends, max_gap=None, on_error="return", **kwargs
+    ):
+        """Return the bytes of ranges of files, fetched in parallel."""
+        if max_gap is not None:
+            raise NotImplementedError("max_gap is not supported")
+        if not isinstance(paths, list):
+            raise TypeError(f"paths must be a list, got {type(paths).__name__}")
+        if not isinstance(starts, list):
+            starts = [starts] * len(paths)
+        if not isinstance(ends, list):
+            ends = [ends] * len(paths)
+        if len(starts) != len(paths) or len(ends) != len(paths):
+            raise ValueError(
+                f"Got {len(paths)} paths, {len(starts)} starts and {len(ends)} ends"
+            )
+
+        # Sign all the URLs at once, so that the ranges are fetched from cache
+        urls = list(dict.fromkeys(self.url(path) for path in paths))
+        _generic_get_signed_urls(urls=urls, route=SignURLRoute.SIGN_URLS_GET)
+
+        def _cat(args):
+            """Fetch one range."""
+            try:
+                return self.cat_file(*args, **kwargs)
+            except Exception as err:
+                if on_error == "return":
+                    return err
+                raise
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(_cat, zip(paths, starts, ends)))
+
+    def _open(
+        self,
+        path,
+        mode="rb",
+        block_size=None,
+        autocommit=True,
+        cache_options=None,
+        **kwargs,
+    ):
+        """Open a file for reading."""
+        if mode != "rb":
+            raise NotImplementedError("The storage can only be read")
+        # Sign the URL lazily, when the file is opened
+        self.client.sign(self.url(path))
+        return TeledetectionFile(
+            self,
+            path,
+            mode=mode,
+            block_size=block_size or self.block_size,
+            cache_type=kwargs.pop("cache_type", self.cache_type),
+            cache_options=cache_options,
+            **kwargs,
+        )
+
+
+class TeledetectionFile(AbstractBufferedFile):  # pylint: disable = W0223
+    """File of the storage, read by blocks."""
+
+    fs: TeledetectionFileSystem
+
+    def _fetch_range(self, start, end):
+        """Fetch bytes from `start` to `end` (excluded)."""
+        return self.fs.cat_file(self.path, start, end)
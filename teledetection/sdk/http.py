@@ -1,16 +1,41 @@
 """HTTP connections with various methods."""
 
-from typing import Dict, Any
+import gzip
+import json
+import time
+from typing import Callable, Dict, Any, Tuple
 from ast import literal_eval
 from pydantic import BaseModel, ConfigDict
 from .logger import get_logger_for
-from .utils import create_session
+from .ratelimit import RATE_LIMITER, retry_after_delay
+from .utils import RETRY_STATUSES, create_session
 from .oauth2 import OAuth2Session, retrieve_token_endpoint
 from .model import ApiKey
 from .settings import ENV
 
 log = get_logger_for(__name__)
 TIMEOUT = ENV.tld_request_timeout
+# Request bodies smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = 1024
+COMPRESS_LEVEL = 6
+
+
+def encode_json_body(params: Dict) -> Tuple[bytes, Dict[str, str]]:
+    """Encode a JSON request body, compressed if `ENV.tld_compress_requests`.
+
+    Args:
+        params: JSON parameters
+
+    Returns:
+        the request body, and the headers to send with it
+
+    """
+    body = json.dumps(params).encode()
+    if ENV.tld_compress_requests and len(body) >= COMPRESS_MIN_BYTES:
+        return gzip.compress(body, compresslevel=COMPRESS_LEVEL), {
+            "Content-Encoding": "gzip"
+        }
+    return body, {}
 
 
 class BareConnectionMethod(BaseModel):
@@ -58,11 +83,19 @@ class HTTPSession:
 
     def __init__(self):
         """Initialize the HTTP session."""
-        self.session = create_session()
+        # 429 are handled in `post()`, with the rate limiter shared by all
+        # the requests to the signing endpoint. With the circuit breaker,
+        # connection errors are not retried: each one counts as a failure,
+        # so that the circuit opens without minutes of backoff
+        self.session = create_session(
+            retry_statuses=tuple(set(RETRY_STATUSES) - {429}),
+            connect_retries=0 if ENV.tld_breaker else None,
+        )
         self.timeout = TIMEOUT
         self.headers = {
             "Content-Type": "application/json",
             "Accept": "application/json",
+            "Accept-Encoding": "gzip, deflate",
         }
         self._method = None
 
@@ -90,13 +123,51 @@ class HTTPSession:
         else:
             self._method = OAuth2ConnectionMethod(endpoint=ENV.tld_signing_endpoint)
 
-    def post(self, route: str, params: Dict):
-        """Perform a POST request."""
+    def post(
+        self,
+        route: str,
+        params: Dict,
+        auth_headers: Dict[str, str] | None = None,
+        record: Callable[[float, bool], None] | None = None,
+    ):
+        """Perform a POST request.
+
+        Requests go through the rate limiter. When throttled (429), all the
+        requests are paused for the `Retry-After` delay, then this one is
+        retried, up to `ENV.tld_retry_total` times.
+
+        Args:
+            route: route
+            params: JSON parameters
+            auth_headers: authentication headers (default: the headers of the
+                connection method)
+            record: function called with the latency (seconds) and success of
+                the last HTTP round trip, without the rate limiting waits
+
+        """
         method = self.get_method()
         url = f"{method.endpoint}{route}"
-        headers = {**self.headers, **method.get_headers()}
+        body, body_headers = encode_json_body(params)
+        if auth_headers is None:
+            auth_headers = method.get_headers()
+        headers = {**self.headers, **body_headers, **auth_headers}
         log.debug("POST to %s", url)
-        response = self.session.post(url, json=params, headers=headers, timeout=TIMEOUT)
+        for attempt in range(ENV.tld_retry_total + 1):
+            RATE_LIMITER.acquire()
+            start = time.perf_counter()
+            try:
+                response = self.session.post(
+                    url, data=body, headers=headers, timeout=TIMEOUT
+                )
+            except Exception:
+                if record:
+                    record(time.perf_counter() - start, False)
+                raise
+            if response.status_code != 429 or attempt == ENV.tld_retry_total:
+                break
+            RATE_LIMITER.pause(retry_after_delay(response.headers, attempt))
+        if record:
+            record(time.perf_counter() - start, response.ok)
         try:
             response.raise_for_status()
         except Exception as e:
@@ -0,0 +1,283 @@
+"""Instrumentation of the signing, exposed as snapshots or Prometheus text.
+
+`metrics.snapshot()` returns a dict of metric name -> {labels: value}, and
+`metrics.to_prometheus()` the metrics in the Prometheus text exposition format.
+"""
+
+import math
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Any, Dict, Sequence, Tuple
+
+Labels = Tuple[str, ...]
+
+CHUNK_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class _Metric(ABC):
+    """Base class of the metrics, with values per set of labels."""
+
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        """Initialize.
+
+        Args:
+            name: metric name
+            doc: metric description
+            labelnames: names of the labels
+
+        """
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Labels, Any] = {}
+
+    def _check(self, labels: Labels):
+        """Check the number of labels."""
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+
+    def reset(self):
+        """Reset all the values."""
+        with self._lock:
+            self._values.clear()
+
+    @abstractmethod
+    def snapshot(self) -> Dict[Labels, Any]:
+        """Return the values, with the label values as keys."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def samples(self) -> list[Tuple[str, Dict[str, str], float]]:
+        """Return the samples of the metric, as (name suffix, labels, value)."""
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic counter."""
+
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1):
+        """Increment the counter for the given label values."""
+        self._check(labels)
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def snapshot(self) -> Dict[Labels, float]:
+        """Return the counts, with the label values as keys."""
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self) -> list[Tuple[str, Dict[str, str], float]]:
+        """Return the samples of the counter."""
+        return [
+            ("", dict(zip(self.labelnames, labels)), value)
+            for labels, value in sorted(self.snapshot().items())
+        ]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values, in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        doc: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        """Initialize.
+
+        Args:
+            name: metric name
+            doc: metric description
+            labelnames: names of the labels
+            buckets: upper bounds of the buckets
+
+        """
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, *labels: str):
+        """Record a value for the given label values."""
+        self._check(labels)
+        with self._lock:
+            if (state := self._values.get(labels)) is None:
+                state = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self) -> Dict[Labels, Dict[str, Any]]:
+        """Return the cumulative buckets, sum and count per label values."""
+        with self._lock:
+            values = {
+                labels: (list(counts), total, count)
+                for labels, (counts, total, count) in self._values.items()
+            }
+        histograms = {}
+        for labels, (counts, total, count) in values.items():
+            cumulative = 0
+            buckets = {}
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                buckets[bound] = cumulative
+            histograms[labels] = {"buckets": buckets, "sum": total, "count": count}
+        return histograms
+
+    def samples(self) -> list[Tuple[str, Dict[str, str], float]]:
+        """Return the samples of the histogram."""
+        samples = []
+        for labels, value in sorted(self.snapshot().items()):
+            label_dict = dict(zip(self.labelnames, labels))
+            for bound, count in value["buckets"].items():
+                le = "+Inf" if bound == math.inf else f"{bound:g}"
+                samples.append(("_bucket", {**label_dict, "le": le}, count))
+            samples.append(("_sum", label_dict, value["sum"]))
+            samples.append(("_count", label_dict, value["count"]))
+        return samples
+
+
+class Registry:
+    """Collection of metrics."""
+
+    def __init__(self):
+        """Initialize."""
+        self.metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> Any:
+        """Add a metric to the registry, and return it."""
+        self.metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self) -> Dict[str, Dict[Labels, Any]]:
+        """Return the values of all metrics."""
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def reset(self):
+        """Reset all metrics."""
+        for metric in self.metrics.values():
+            metric.reset()
+
+    def to_prometheus(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.doc}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in metric.samples():
+                label_str = ",".join(
+                    f'{key}="{_escape(val)}"' for key, val in labels.items()
+                )
+                label_str = f"{{{label_str}}}" if label_str else ""
+                lines.append(f"{metric.name}{suffix}{label_str} {_format(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format(value: float) -> str:
+    """Format a sample value, without losing precision."""
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    """Escape a label value."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+REGISTRY = Registry()
+
+SIGNING_URLS = REGISTRY.register(
+    Counter(
+        "tld_signing_urls_total",
+        "URLs looked up for read access, by outcome "
+        "(foreign, already_signed, cache_hit, disk_cache_hit, expired, miss)",
+        ["outcome"],
+    )
+)
+SIGNING_REQUESTS = REGISTRY.register(
+    Counter(
+        "tld_signing_requests_total",
+        "Requests to the signing endpoint, by route and status (ok, error)",
+        ["route", "status"],
+    )
+)
+SIGNING_CHUNK_SIZE = REGISTRY.register(
+    Histogram(
+        "tld_signing_chunk_size",
+        "Number of URLs per request to the signing endpoint",
+        ["route"],
+        buckets=CHUNK_SIZE_BUCKETS,
+    )
+)
+SIGNING_LATENCY = REGISTRY.register(
+    Histogram(
+        "tld_signing_request_seconds",
+        "Latency of the requests to the signing endpoint",
+        ["route"],
+        buckets=LATENCY_BUCKETS,
+    )
+)
+TOKEN_REFRESHES = REGISTRY.register(
+    Counter(
+        "tld_token_refreshes_total",
+        "OAuth2 token renewals, by method (refresh_token, authentication)",
+        ["method"],
+    )
+)
+SIGNING_THROTTLED = REGISTRY.register(
+    Counter(
+        "tld_signing_throttled_total",
+        "Requests to the signing endpoint answered with 429 (too many requests)",
+    )
+)
+SIGNING_CIRCUIT_OPENED = REGISTRY.register(
+    Counter(
+        "tld_signing_circuit_opened_total",
+        "Openings of the circuit breaker of the signing endpoint",
+    )
+)
+SIGNING_STALE_URLS = REGISTRY.register(
+    Counter(
+        "tld_signing_stale_urls_total",
+        "Signed URLs past the TTL margin served while the endpoint is failing",
+    )
+)
+
+
+def record_signing_request(route: str, n_urls: int, latency: float, success: bool):
+    """Record a request to the signing endpoint, its status and latency.
+
+    Args:
+        route: route of the signing endpoint
+        n_urls: number of URLs in the request
+        latency: duration of the HTTP round trip (seconds)
+        success: whether the request succeeded
+
+    """
+    SIGNING_REQUESTS.inc(route, "ok" if success else "error")
+    SIGNING_CHUNK_SIZE.observe(n_urls, route)
+    SIGNING_LATENCY.observe(latency, route)
+
+
+def snapshot() -> Dict[str, Dict[Labels, Any]]:
+    """Return the values of all metrics, with the label values as keys."""
+    return REGISTRY.snapshot()
+
+
+def to_prometheus() -> str:
+    """Return all metrics in the Prometheus text exposition format."""
+    return REGISTRY.to_prometheus()
+
+
+def reset():
+    """Reset all metrics."""
+    REGISTRY.reset()
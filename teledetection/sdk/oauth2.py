@@ -2,6 +2,7 @@
 
 import datetime
 import io
+import threading
 import time
 from abc import abstractmethod
 from typing import Dict
@@ -10,6 +11,7 @@ import qrcode
 
 from .logger import get_logger_for  # type: ignore
 from .utils import create_session
+from .metrics import TOKEN_REFRESHES
 from .model import JWT, DeviceGrantResponse
 from .settings import ENV
 
@@ -160,6 +162,8 @@ class OAuth2Session:
         self.jwt_ttl_margin_seconds = 60
         self.jwt_issuance = datetime.datetime(year=1, month=1, day=1)
         self.jwt: JWT | None = None
+        # Threads must not authenticate or refresh the token concurrently
+        self._lock = threading.Lock()
 
     def save_token(self, now: datetime.datetime):
         """Save the JWT to disk."""
@@ -192,6 +196,7 @@ class OAuth2Session:
             # Access token in not valid, but refresh might be
             try:
                 self.jwt = self.grant.refresh_token(self.jwt)
+                TOKEN_REFRESHES.inc("refresh_token")
             except RefreshTokenError as con_err:
                 log.warning(  # pragma: no cover
                     "Unable to refresh token (reason: %s). "
@@ -199,6 +204,7 @@ class OAuth2Session:
                     con_err,
                 )
                 self.jwt = self.grant.get_first_token()  # pragma: no cover
+                TOKEN_REFRESHES.inc("authentication")  # pragma: no cover
         else:
             # Token is still valid
             log.debug("Credentials still valid")
@@ -207,7 +213,8 @@ class OAuth2Session:
 
     def get_access_token(self) -> str:
         """Return the access token."""
-        self._init_jwt()
-        self._refresh_if_needed()
-        assert self.jwt
-        return self.jwt.access_token
+        with self._lock:
+            self._init_jwt()
+            self._refresh_if_needed()
+            assert self.jwt
+            return self.jwt.access_token
@@ -0,0 +1,172 @@
+"""Local HTTP proxy to the storage, signing URLs on the fly.
+
+Tools like GDAL can read `http://127.0.0.1:<port>/<bucket>/<key>` through
+`/vsicurl/`: these URLs never expire, and the proxy forwards the requests
+(including range requests) to the storage with freshly signed URLs.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+
+from .breaker import SigningUnavailable
+from .logger import get_logger_for
+from .storage import DEFAULT_STORAGE_ENDPOINT, StorageClient
+
+log = get_logger_for(__name__)
+
+DEFAULT_PROXY_PORT = 8089
+
+# Request headers forwarded to the storage
+FORWARDED_REQUEST_HEADERS = (
+    "Range",
+    "If-Range",
+    "If-Match",
+    "If-None-Match",
+    "If-Modified-Since",
+)
+
+# Response headers forwarded to the client
+FORWARDED_RESPONSE_HEADERS = (
+    "Content-Encoding",
+    "Content-Length",
+    "Content-Range",
+    "Content-Type",
+    "Accept-Ranges",
+    "ETag",
+    "Last-Modified",
+)
+
+PROXY_CHUNK_SIZE = 1024 * 1024
+
+
+class SigningProxy(ThreadingHTTPServer):
+    """HTTP server forwarding GET and HEAD requests to the storage.
+
+    The path of the requests is appended to the storage endpoint, and the
+    resulting URL is signed with the SDK. Requests that would reach another
+    host (e.g. `GET @example.com/x`) are rejected.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = DEFAULT_PROXY_PORT,
+        storage_endpoint: str = DEFAULT_STORAGE_ENDPOINT,
+        client: StorageClient | None = None,
+    ):
+        """Initialize.
+
+        Args:
+            host: address to listen on
+            port: port to listen on (0 picks a free port)
+            storage_endpoint: storage endpoint the requests are forwarded to
+            client: storage client (a new one is created if not provided)
+
+        """
+        self.storage_endpoint = storage_endpoint.rstrip("/")
+        self.client = client or StorageClient()
+        super().__init__((host, port), _ProxyHandler)
+
+    @property
+    def url(self) -> str:
+        """Base URL of the proxy."""
+        host, port = self.server_address[:2]
+        if isinstance(host, bytes):
+            host = host.decode()
+        return f"http://{host}:{port}"
+
+
+class _ProxyHandler(BaseHTTPRequestHandler):
+    """Request handler of the signing proxy."""
+
+    server: SigningProxy
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):  # pylint: disable = W0622
+        """Log requests with the SDK logger."""
+        log.debug(format, *args)
+
+    def _storage_url(self) -> str | None:
+        """Return the storage URL of the request (None if not on the storage).
+
+        The request target must be a path: anything else (e.g. `@host/path`)
+        could make the signed URL point to another host.
+        """
+        if not self.path.startswith("/"):
+            return None
+        endpoint = urlsplit(self.server.storage_endpoint)
+        path, _, query = self.path.partition("#")[0].partition("?")
+        url = urlunsplit(
+            (endpoint.scheme, endpoint.netloc, endpoint.path + path, query, "")
+        )
+        return url if urlsplit(url).netloc == endpoint.netloc else None
+
+    def _forward(self, method: str):
+        """Forward the request to the storage, and stream the response."""
+        if (url := self._storage_url()) is None:
+            log.warning("Rejected request target %s", self.path)
+            self.send_error(400, explain="The request target must be a path")
+            return
+        headers = {
+            name: self.headers[name]
+            for name in FORWARDED_REQUEST_HEADERS
+            if name in self.headers
+        }
+        try:
+            response = self.server.client.request(
+                method, url, headers=headers, stream=True
+            )
+        except SigningUnavailable as err:
+            log.warning("Unable to sign %s (%s)", url, err)
+            self.send_error(503, explain=str(err))
+            return
+        except requests.RequestException as err:
+            log.warning("Unable to reach %s (%s)", url, err)
+            self.send_error(502, explain=str(err))
+            return
+        with response:
+            self.send_response(response.status_code)
+            for name in FORWARDED_RESPONSE_HEADERS:
+                if name in response.headers:
+                    self.send_header(name, response.headers[name])
+            if "Content-Length" not in response.headers:
+                self.send_header("Connection", "close")
+                self.close_connection = True
+            self.end_headers()
+            if method == "HEAD":
+                return
+            for chunk in response.raw.stream(PROXY_CHUNK_SIZE, decode_content=False):
+                self.wfile.write(chunk)
+
+    def do_GET(self):  # pylint: disable = invalid-name
+        """Forward GET requests."""
+        self._forward("GET")
+
+    def do_HEAD(self):  # pylint: disable = invalid-name
+        """Forward HEAD requests (as GET requests of the first byte)."""
+        self._forward("HEAD")
+
+
+def serve(
+    host: str = "127.0.0.1",
+    port: int = DEFAULT_PROXY_PORT,
+    storage_endpoint: str = DEFAULT_STORAGE_ENDPOINT,
+):
+    """Run the signing proxy until interrupted.
+
+    Args:
+        host: address to listen on
+        port: port to listen on
+        storage_endpoint: storage endpoint the requests are forwarded to
+
+    """
+    with SigningProxy(host=host, port=port, storage_endpoint=storage_endpoint) as proxy:
+        log.info("Signing proxy to %s on %s", storage_endpoint, proxy.url)
+        try:
+            proxy.serve_forever()
+        except KeyboardInterrupt:
+            log.info("Signing proxy stopped")
@@ -0,0 +1,144 @@
+"""Client-side rate limiting of the requests to the signing endpoint.
+
+The limiter is a token bucket, implemented as a generic cell rate algorithm:
+its whole state is the theoretical arrival time of the next request. It is
+shared by the threads of the process and, when `ENV.tld_rate_limit_file` is
+set, by all the processes of the host using the same file.
+"""
+
+import os
+import struct
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Mapping, Tuple
+
+from .logger import get_logger_for
+from .metrics import SIGNING_THROTTLED
+from .settings import ENV
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+log = get_logger_for(__name__)
+
+STATE = struct.Struct("<d")
+# Delay without Retry-After header is `ENV.tld_retry_backoff_factor * 2**n`
+MAX_BACKOFF = 120
+
+
+class RateLimiter:
+    """Token bucket of `ENV.tld_rate_limit` requests per second.
+
+    Up to `ENV.tld_rate_limit_burst` requests can be sent at once, then
+    requests are spread evenly. A pause (e.g. after a 429 with a
+    `Retry-After` header) delays all the following requests, and the
+    requests resume at the limited rate, without burst. With
+    `ENV.tld_rate_limit` set to 0, only the pauses are enforced.
+    """
+
+    def __init__(self):
+        """Initialize."""
+        self._lock = threading.Lock()
+        self._tat = 0.0
+        self._warned = False
+
+    @property
+    def _interval(self) -> float:
+        """Time between two requests at the limited rate."""
+        return 1 / ENV.tld_rate_limit if ENV.tld_rate_limit else 0.0
+
+    @property
+    def _tolerance(self) -> float:
+        """Time by which requests can be ahead of the limited rate."""
+        return (ENV.tld_rate_limit_burst - 1) * self._interval
+
+    def _update(self, func: Callable[[float, float], Tuple[float, float]]) -> float:
+        """Update the shared state.
+
+        Args:
+            func: function of (theoretical arrival time, now), returning the
+                new theoretical arrival time and a result
+
+        Returns:
+            the result of `func`
+
+        """
+        with self._lock:
+            if not ENV.tld_rate_limit_file or fcntl is None:
+                if ENV.tld_rate_limit_file and not self._warned:
+                    log.warning("File locks are unavailable, rate limit per process")
+                    self._warned = True
+                self._tat, result = func(self._tat, time.time())
+                return result
+            fd = os.open(ENV.tld_rate_limit_file, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                data = os.pread(fd, STATE.size, 0)
+                tat = STATE.unpack(data)[0] if len(data) == STATE.size else 0.0
+                tat, result = func(tat, time.time())
+                os.pwrite(fd, STATE.pack(tat), 0)
+                return result
+            finally:
+                os.close(fd)
+
+    def reserve(self) -> float:
+        """Reserve the slot of a request.
+
+        Returns:
+            the time (seconds) to wait before sending the request
+
+        """
+        interval, tolerance = self._interval, self._tolerance
+
+        def _reserve(tat: float, now: float) -> Tuple[float, float]:
+            allowed_at = max(now, tat - tolerance)
+            return max(tat, allowed_at) + interval, allowed_at - now
+
+        return self._update(_reserve)
+
+    def acquire(self):
+        """Wait for the slot of a request."""
+        if (delay := self.reserve()) > 0:
+            log.debug("Rate limited, waiting %.3f s", delay)
+            time.sleep(delay)
+
+    def pause(self, delay: float):
+        """Delay all the requests by `delay` seconds from now."""
+        tolerance = self._tolerance
+        SIGNING_THROTTLED.inc()
+        log.info("Signing endpoint throttled, pausing requests for %s s", delay)
+
+        def _pause(tat: float, now: float) -> Tuple[float, float]:
+            return max(tat, now + delay + tolerance), 0.0
+
+        self._update(_pause)
+
+
+def retry_after_delay(headers: Mapping[str, str], attempt: int) -> float:
+    """Return the delay before retrying a throttled request.
+
+    Args:
+        headers: response headers
+        attempt: number of attempts so far, minus one
+
+    Returns:
+        the `Retry-After` delay, or an exponential backoff without it, capped
+        at `ENV.tld_retry_after_max`
+
+    """
+    delay = min(ENV.tld_retry_backoff_factor * 2**attempt, MAX_BACKOFF)
+    if value := headers.get("Retry-After"):
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                log.warning("Invalid Retry-After header: %s", value)
+    return min(max(delay, 0.0), ENV.tld_retry_after_max)
+
+
+RATE_LIMITER = RateLimiter()
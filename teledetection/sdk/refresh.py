@@ -0,0 +1,102 @@
+"""Refresh-ahead of recently used signed URLs."""
+
+import threading
+import time
+from typing import Callable, Dict, Mapping, Protocol, Tuple
+
+from .logger import get_logger_for
+from .settings import ENV
+
+log = get_logger_for(__name__)
+
+
+class Expiring(Protocol):  # pylint: disable = R0903
+    """Signed URL with an expiry."""
+
+    @property
+    def expires_at(self) -> float:
+        """Expiry, as a POSIX timestamp."""
+
+
+class RefreshAhead:
+    """Background re-signing of recently used signed URLs.
+
+    URLs that were used within the last `ENV.tld_refresh_ahead_idle` seconds
+    are re-signed in batches as soon as their TTL drops below
+    `ENV.tld_ttl_margin + ENV.tld_refresh_ahead_lead`, so that the next
+    lookup always hits a fresh cache entry.
+    """
+
+    def __init__(self, resign: Callable[[list[str]], Mapping[str, Expiring]]):
+        """Initialize.
+
+        Args:
+            resign: function signing a list of URLs, bypassing the cache, and
+                returning the new signed URLs (which it must put in cache)
+
+        """
+        self.resign = resign
+        # Key is the URL, value is (last use, expiry) as POSIX timestamps
+        self._used: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def touch(self, signed_urls: Mapping[str, Expiring]):
+        """Record the use of signed URLs."""
+        now = time.time()
+        with self._lock:
+            for url, signed_url in signed_urls.items():
+                self._used[url] = (now, signed_url.expires_at)
+
+    def refresh_once(self):
+        """Re-sign the recently used URLs that will soon be too old."""
+        now = time.time()
+        deadline = now + ENV.tld_ttl_margin + ENV.tld_refresh_ahead_lead
+        with self._lock:
+            for url, (last_use, _) in list(self._used.items()):
+                if now - last_use > ENV.tld_refresh_ahead_idle:
+                    del self._used[url]
+            urls = [url for url, (_, exp) in self._used.items() if exp < deadline]
+        if not urls:
+            return
+        log.debug("Refreshing %s signed URLs ahead of expiry", len(urls))
+        try:
+            signed_urls = self.resign(urls)
+        except Exception as err:
+            log.warning("Unable to refresh signed URLs (%s), will retry", err)
+            return
+        with self._lock:
+            for url, signed_url in signed_urls.items():
+                if url in self._used:
+                    last_use = self._used[url][0]
+                    self._used[url] = (last_use, signed_url.expires_at)
+
+    @property
+    def running(self) -> bool:
+        """Whether the background refresh is running."""
+        return bool(self._thread and self._thread.is_alive())
+
+    def _run(self):
+        """Refresh periodically, until stopped."""
+        while not self._stop.wait(ENV.tld_refresh_ahead_period):
+            self.refresh_once()
+
+    def start(self):
+        """Start refreshing in a background thread."""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="tld-refresh-ahead", daemon=True
+        )
+        self._thread.start()
+        log.debug("Refresh-ahead of signed URLs started")
+
+    def stop(self):
+        """Stop refreshing."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        log.debug("Refresh-ahead of signed URLs stopped")
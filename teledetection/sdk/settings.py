@@ -2,7 +2,12 @@
 
 import os
 from pydantic_settings import BaseSettings
-from pydantic.types import NonNegativeInt, PositiveInt, PositiveFloat
+from pydantic.types import (
+    NonNegativeFloat,
+    NonNegativeInt,
+    PositiveInt,
+    PositiveFloat,
+)
 from pydantic import field_validator
 import appdirs  # type: ignore
 from .logger import get_logger_for
@@ -29,6 +34,33 @@ class Settings(BaseSettings):
     tld_retry_backoff_factor: PositiveFloat = 0.8
     tld_disable_auth: bool = False
     tld_signing_endpoint: str = DEFAULT_SIGNING_ENDPOINT
+    tld_signing_workers: PositiveInt = 4
+    tld_signing_chunk_retries: NonNegativeInt = 1
+    tld_disk_cache: bool = False
+    tld_disk_cache_dir: str = ""
+    tld_cache_max_entries: PositiveInt = 200_000
+    tld_cache_max_bytes: PositiveInt = 256 * 1024 * 1024
+    tld_refresh_ahead: bool = False
+    tld_refresh_ahead_lead: NonNegativeInt = 600
+    tld_refresh_ahead_period: PositiveFloat = 60
+    tld_refresh_ahead_idle: PositiveInt = 3600
+    tld_coalesce: bool = False
+    tld_coalesce_window: NonNegativeFloat = 0.005
+    tld_max_urls: PositiveInt = MAX_URLS
+    tld_adaptive_batch: bool = False
+    tld_adaptive_batch_min: PositiveInt = 8
+    tld_adaptive_batch_latency: PositiveFloat = 1.0
+    tld_max_request_bytes: PositiveInt = 1024 * 1024
+    tld_compress_requests: bool = False
+    tld_rate_limit: NonNegativeFloat = 0.0
+    tld_rate_limit_burst: PositiveInt = 4
+    tld_rate_limit_file: str = ""
+    tld_retry_after_max: PositiveFloat = 300
+    tld_breaker: bool = True
+    tld_breaker_failures: PositiveInt = 5
+    tld_breaker_cooldown: PositiveFloat = 30
+    tld_serve_stale: bool = False
+    tld_serve_stale_min_ttl: NonNegativeInt = 60
 
     @field_validator("tld_signing_endpoint", mode="after")
     @classmethod
@@ -44,17 +76,29 @@ class Settings(BaseSettings):
 ENV = Settings()
 
 
+def _make_dir(path: str, kind: str) -> str | None:
+    """Create a directory if needed, and return it (None if not writable)."""
+    if not os.path.exists(path):
+        try:
+            os.makedirs(path)
+            log.debug("%s dir created in %s", kind, path)
+        except PermissionError:
+            log.warning("Unable to use %s dir %s", kind, path)  # pragma: no cover
+            return None  # pragma: no cover
+    else:
+        log.debug("Using existing %s dir %s", kind, path)
+    return path
+
+
 def get_config_path() -> str | None:
     """Get path to config directory (usually in ~/.config/)."""
     log.debug("Get config path")
     cfg_path = ENV.tld_config_dir or appdirs.user_config_dir(appname=APP_NAME)
-    if not os.path.exists(cfg_path):
-        try:
-            os.makedirs(cfg_path)
-            log.debug("Config dir created in %s", cfg_path)
-        except PermissionError:
-            log.warning("Unable to use config dir %s", cfg_path)  # pragma: no cover
-            cfg_path = None  # pragma: no cover
-    else:
-        log.debug("Using existing config dir %s", cfg_path)
-    return cfg_path
+    return _make_dir(cfg_path, "Config")
+
+
+def get_cache_path() -> str | None:
+    """Get path to the local cache directory (usually in ~/.cache/)."""
+    log.debug("Get cache path")
+    cache_path = ENV.tld_disk_cache_dir or appdirs.user_cache_dir(appname=APP_NAME)
+    return _make_dir(cache_path, "Cache")
@@ -5,18 +5,30 @@ endpoint instead.
 """
 
 import collections.abc
-import math
 import re
+import threading
 import time
+from concurrent.futures import Future
+from contextvars import ContextVar
 from copy import deepcopy
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 from functools import singledispatch
-from typing import Any, Dict, Mapping, TypeVar, cast
+from queue import Full, Queue
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    Mapping,
+    MutableMapping,
+    NamedTuple,
+    TypeVar,
+    cast,
+)
 from enum import Enum
-from urllib.parse import parse_qs, urlparse
+from urllib.parse import urlparse
 
 import pystac_client
-from pydantic import BaseModel, ConfigDict  # pylint: disable = no-name-in-module
 from pystac import (
     Asset,
     Collection,
@@ -27,8 +39,24 @@ from pystac import (
 from pystac.serialization.identify import identify_stac_object_type
 from pystac_client import ItemSearch
 
-from .http import session
-from .settings import S3_STORAGE_DOMAIN, MAX_URLS, ENV
+from .cache import CacheEntry, CachedSignedURL, MemoryCache, get_disk_cache
+from .coalesce import SignCoalescer
+from .dispatch import (
+    SignURLRoute,
+    SignedURLBatch,
+    URLBase,
+    _dispatch_chunks,
+    _make_chunks,
+    _serve_stale,
+)
+from .expiry import (
+    NotSignedURL,
+    _parse_signed_url_expiry,
+    _parse_signed_url_expiry_slow,
+)
+from .metrics import SIGNING_URLS
+from .refresh import RefreshAhead
+from .settings import S3_STORAGE_DOMAIN, ENV
 from .logger import get_logger_for
 
 
@@ -39,29 +67,29 @@ asset_xpr = re.compile(
     r"\.meso\.umontpellier\.fr\/(?P<blob>[^<]+)"  # ignore
 )
 
-log = get_logger_for(__name__)
+# Encoding of "&" in the URLs of VRTs
+VRT_AMP_STR = "&Amp;"
 
+# Network location of plain http(s) URLs (other URLs are left to `urlparse`)
+netloc_xpr = re.compile(r"https?://([^/?#\s\\]*)(?:[/?#]|$)")
 
-class NotSignedURL(Exception):
-    """The URL is not signed."""
+log = get_logger_for(__name__)
 
 
 class ExpiredSignedURL(Exception):
     """The signed URL has expired."""
 
 
-class URLBase(BaseModel):  # pylint: disable = R0903
-    """Base model for responses."""
-
-    model_config = ConfigDict(populate_by_name=True)
-    expiry: datetime
-
-
 class SignedURL(URLBase):  # pylint: disable = R0903
     """Signed URL response."""
 
     href: str
 
+    @property
+    def expires_at(self) -> float:
+        """Expiry, as a POSIX timestamp."""
+        return self.expiry.timestamp()
+
     def ttl(self) -> float:
         """Return the number of seconds the token is still valid for."""
         return (self.expiry - datetime.now(timezone.utc)).total_seconds()
@@ -69,44 +97,57 @@ class SignedURL(URLBase):  # pylint: disable = R0903
     @classmethod
     def from_already_signed(cls, signed_href: str):
         """Create an instance from an already signed URL."""
-        parsed_url = urlparse(signed_href.rstrip("/"))
-        parsed_qs = parse_qs(parsed_url.query)
-        parsed_date = parsed_qs.get("X-Amz-Date", [""])
-        parsed_expiry = parsed_qs.get("X-Amz-Expires", [""])
-
-        # Grab date
-        try:
-            log.debug("Parsing date from signed URL %s (%s)", signed_href, parsed_date)
-            parsed_datetime = datetime.strptime(
-                parsed_date[0], "%Y%m%dT%H%M%SZ"
-            ).replace(tzinfo=timezone.utc)
-        except ValueError as err:
-            raise NotSignedURL(f"Cannot parse date from URL {signed_href}") from err
-
-        # Grab expiry
-        try:
-            log.debug("Parsing expiry from signed URL %s", signed_href)
-            parsed_expiry_td = timedelta(seconds=int(parsed_expiry[0]))
-        except ValueError as err:
-            raise NotSignedURL(f"Cannot parse expiry from URL {signed_href}") from err
-
-        # Try to instantiate the SignedURL object and check its TTL
-        if (
-            url := cls(expiry=parsed_datetime + parsed_expiry_td, href=signed_href)
-        ).ttl() < ENV.tld_ttl_margin:
+        if (expiry := _parse_signed_url_expiry(signed_href)) is None:
+            # Raise with the reason why the URL can't be parsed
+            _parse_signed_url_expiry_slow(signed_href)
+            raise NotSignedURL(f"Cannot parse URL {signed_href}")
+
+        # Instantiate the SignedURL object and check its TTL
+        url = cls.model_construct(expiry=expiry, href=signed_href)
+        if url.ttl() < ENV.tld_ttl_margin:
             raise ExpiredSignedURL(f"The signed URL {signed_href} has expired")
         return url
 
 
-class SignedURLBatch(URLBase):  # pylint: disable = R0903
-    """Signed URLs (batch of URLs) response."""
+# URLs being signed, with the future result shared by all the waiting threads
+_IN_FLIGHT: Dict[str, Future] = {}
+_IN_FLIGHT_LOCK = threading.Lock()
 
-    hrefs: dict
+# Cache of signing requests so we can reuse them
+# Key is the signing URL, value is the S3 token. It can be replaced by any
+# mutable mapping (e.g. a plain dict, for an unbounded cache)
+CACHE: MutableMapping[str, CacheEntry] = MemoryCache()
+
+# Function used instead of `sign_urls` in the current context. This lets the
+# asyncio API run the synchronous signers without any network access.
+SIGN_URLS_OVERRIDE: ContextVar[Callable[[list[str]], Dict[str, str]] | None] = (
+    ContextVar("SIGN_URLS_OVERRIDE", default=None)
+)
 
+# Coalescing of single URL signing requests (opt-in)
+COALESCER = SignCoalescer(sign_batch=lambda urls: sign_urls(urls=urls))
+
+# Background re-signing of recently used URLs (opt-in)
+REFRESHER = RefreshAhead(
+    resign=lambda urls: _request_signed_urls(
+        urls=urls, route=SignURLRoute.SIGN_URLS_GET
+    )
+)
+
+
+def start_refresh_ahead():
+    """Re-sign recently used URLs in the background, before they expire.
+
+    This is started by the first signing when `ENV.tld_refresh_ahead` is set.
+    See :class:`teledetection.sdk.refresh.RefreshAhead` for more.
+
+    """
+    REFRESHER.start()
 
-# Cache of signing requests so we can reuse them
-# Key is the signing URL, value is the S3 token
-CACHE: Dict[str, SignedURL] = {}
+
+def stop_refresh_ahead():
+    """Stop re-signing recently used URLs in the background."""
+    REFRESHER.stop()
 
 
 @singledispatch
@@ -147,6 +188,53 @@ def is_vrt_string(string: str) -> bool:
     )
 
 
+class CopyStrategy(Enum):
+    """How signed STAC objects are copied (`copy` argument of `sign`).
+
+    `copy=True` clones the whole object. `CopyStrategy.ASSETS` copies only
+    the assets (and the mapping holding them): the copy shares its geometry,
+    properties and links with the original, which must then be treated as
+    read-only.
+    """
+
+    CLONE = "clone"
+    ASSETS = "assets"
+
+
+StacObjectWithAssets = TypeVar("StacObjectWithAssets", Item, Collection)
+
+
+def _shallow_copy(obj: Any) -> Any:
+    """Copy an object, sharing its attributes (faster than `copy.copy`)."""
+    obj_copy = object.__new__(type(obj))
+    obj_copy.__dict__.update(obj.__dict__)
+    return obj_copy
+
+
+def _copy_stac_object(
+    obj: StacObjectWithAssets, copy: bool | CopyStrategy
+) -> StacObjectWithAssets:
+    """Copy an item or a collection before signing its assets."""
+    if copy == CopyStrategy.ASSETS:
+        obj_copy = _shallow_copy(obj)
+        obj_copy.assets = {}
+        for key, asset in obj.assets.items():
+            asset_copy = _shallow_copy(asset)
+            asset_copy.owner = obj_copy
+            obj_copy.assets[key] = asset_copy
+        return obj_copy
+    if not copy:
+        return obj
+    if isinstance(obj, Collection):
+        # https://github.com/stac-utils/pystac/pull/834 fixed asset dropping
+        assets = obj.assets
+        obj_copy = obj.clone()
+        if assets and not obj_copy.assets:
+            obj_copy.assets = deepcopy(assets)
+        return obj_copy
+    return obj.clone()
+
+
 @sign.register(str)
 def sign_string(url: str, copy: bool = True) -> str:
     """Sign a URL or VRT-like string containing URLs with a S3 Token.
@@ -172,14 +260,42 @@ def sign_string(url: str, copy: bool = True) -> str:
     """
     if is_vrt_string(url):
         return sign_vrt_string(url)
-    return sign_urls(urls=[url])[url]
+    return _sign_single_url(url)
+
+
+def _sign_single_url(url: str, siblings: list[str] | None = None) -> str:
+    """Sign a single URL.
 
+    When `ENV.tld_coalesce` is set, uncached URLs are buffered for
+    `ENV.tld_coalesce_window` seconds and signed in a single batch with the
+    URLs requested meanwhile by other threads.
 
-class SignURLRoute(Enum):
-    """Different routes used for sign_urls."""
+    Args:
+        url: URL to sign
+        siblings: other URLs likely to be signed soon (e.g. the other assets
+            of the same item), signed in the same batch when coalescing
 
-    SIGN_URLS_GET = "sign_urls"
-    SIGN_URLS_PUT = "sign_urls_put"
+    Returns:
+        str: the signed URL
+
+    """
+    if (
+        not ENV.tld_coalesce
+        or SIGN_URLS_OVERRIDE.get()
+        or not _is_storage_url(url)
+    ):
+        return sign_urls(urls=[url])[url]
+    if url in CACHE and (signed_url := _get_cached(url)):
+        return signed_url.href
+    return COALESCER.submit([url, *(siblings or [])])[url].result()
+
+
+def _is_storage_url(url: str) -> bool:
+    """Whether the URL belongs to the S3 storage."""
+    if match := netloc_xpr.match(url):
+        # Same as `urlparse`, without its overhead, for the common URLs
+        return match.group(1).endswith(S3_STORAGE_DOMAIN)
+    return urlparse(url.rstrip("/")).netloc.endswith(S3_STORAGE_DOMAIN)
 
 
 def _generic_sign_urls(urls: list[str], route: SignURLRoute) -> Dict[str, str]:
@@ -199,22 +315,28 @@ def _generic_sign_urls(urls: list[str], route: SignURLRoute) -> Dict[str, str]:
         dict of signed HREF: key = original URL, value = signed URL
 
     """
-    signed_urls = {}
-    for url in urls:
-        if not urlparse(url.rstrip("/")).netloc.endswith(S3_STORAGE_DOMAIN):
-            # Outside our domain
-            signed_urls[url] = url
-        # elif parsed_url.netloc == "????":
-        #     # special case for public assets storing thumbnails...
-        #     return url
-
-    not_signed_urls = [url for url in urls if url not in signed_urls]
+    if route != SignURLRoute.SIGN_URLS_GET:
+        # For write access, we don't filter out URLs.
+        foreign = [url for url in dict.fromkeys(urls) if not _is_storage_url(url)]
+        signed_urls = {url: url for url in foreign}
+        to_sign = [url for url in dict.fromkeys(urls) if url not in signed_urls]
+        if to_sign:
+            signed_urls.update(
+                {
+                    url: signed_url.href
+                    for url, signed_url in _request_signed_urls(
+                        urls=to_sign, route=route
+                    ).items()
+                }
+            )
+        return signed_urls
+
+    buckets = _classify_urls(urls)
+    signed_urls = {url: url for url in buckets.foreign}
     signed_urls.update(
         {
             url: signed_url.href
-            for url, signed_url in _generic_get_signed_urls(
-                urls=not_signed_urls, route=route
-            ).items()
+            for url, signed_url in _get_signed_buckets(buckets).items()
         }
     )
     return signed_urls
@@ -222,6 +344,8 @@ def _generic_sign_urls(urls: list[str], route: SignURLRoute) -> Dict[str, str]:
 
 def sign_urls(urls: list[str]) -> Dict[str, str]:
     """Sign multiple URLs for GET."""
+    if override := SIGN_URLS_OVERRIDE.get():
+        return override(urls)
     return _generic_sign_urls(urls=urls, route=SignURLRoute(SignURLRoute.SIGN_URLS_GET))
 
 
@@ -254,31 +378,41 @@ def sign_vrt_string(vrt: str, copy: bool = True) -> str:  # pylint: disable = W0
         str: The signed VRT
 
     """
-    urls = []
-
-    def _repl_vrt(m: re.Match):
-        urls.append(m.string[slice(*m.span())])
-
-    asset_xpr.sub(_repl_vrt, vrt)
-    signed_urls = sign_urls(urls)
+    # Tokenise the VRT once: text between URLs, and URLs to sign
+    matches = list(asset_xpr.finditer(vrt))
+    if not matches:
+        return vrt
 
     # The "&" needs to be encoded in signed URLs inside the .vrt
-    for url, signed_url in signed_urls.items():
-        signed_urls[url] = signed_url.replace("&", "&Amp;")
+    urls = {
+        found: found.replace(VRT_AMP_STR, "&")
+        for found in dict.fromkeys(match.group() for match in matches)
+    }
+    signed_urls = sign_urls(list(dict.fromkeys(urls.values())))
+    replacements = {
+        found: signed_urls[url].replace("&", VRT_AMP_STR) for found, url in urls.items()
+    }
 
     # Replace urls with signed urls (single pass)
-    rep = dict((re.escape(k), v) for k, v in signed_urls.items())
-    pattern = re.compile("|".join(rep.keys()))
-    return pattern.sub(lambda m: rep[re.escape(m.group(0))], vrt)
+    pieces = []
+    pos = 0
+    for match in matches:
+        pieces.append(vrt[pos : match.start()])
+        pieces.append(replacements[match.group()])
+        pos = match.end()
+    pieces.append(vrt[pos:])
+    return "".join(pieces)
 
 
 @sign.register(Item)
-def sign_item(item: Item, copy: bool = True) -> Item:
+def sign_item(item: Item, copy: bool | CopyStrategy = True) -> Item:
     """Sign all assets within a PySTAC item.
 
     Args:
         item (Item): The Item whose assets that will be signed
-        copy (bool): Whether to copy (clone) the item or mutate it inplace.
+        copy (bool | CopyStrategy): Whether to copy (clone) the item or
+            mutate it inplace. With `CopyStrategy.ASSETS`, only the assets
+            are copied.
 
     Returns:
         Item: An Item where all assets' HREFs have
@@ -287,8 +421,7 @@ def sign_item(item: Item, copy: bool = True) -> Item:
         expiry time for any assets that were signed.
 
     """
-    if copy:
-        item = item.clone()
+    item = _copy_stac_object(item, copy=copy)
     urls = [asset.href for asset in item.assets.values()]
     signed_urls = sign_urls(urls=urls)
     for key, asset in item.assets.items():
@@ -297,35 +430,44 @@ def sign_item(item: Item, copy: bool = True) -> Item:
 
 
 @sign.register(Asset)
-def sign_asset(asset: Asset, copy: bool = True) -> Asset:
+def sign_asset(asset: Asset, copy: bool | CopyStrategy = True) -> Asset:
     """Sign a PySTAC asset.
 
     Args:
         asset (Asset): The Asset to sign
-        copy (bool): Whether to copy (clone) the asset or mutate it inplace.
+        copy (bool | CopyStrategy): Whether to copy (clone) the asset or
+            mutate it inplace. With `CopyStrategy.ASSETS`, the asset is
+            shallow copied.
 
     Returns:
         Asset: An asset where the HREF is replaced with a
         signed version.
 
     """
-    if copy:
+    siblings = None
+    if ENV.tld_coalesce and asset.owner and hasattr(asset.owner, "assets"):
+        # Other assets of the item are likely to be signed next
+        siblings = [sibling.href for sibling in asset.owner.assets.values()]
+    if copy == CopyStrategy.ASSETS:
+        asset = _shallow_copy(asset)
+    elif copy:
         asset = asset.clone()
-    asset.href = sign_urls([asset.href])[asset.href]
+    asset.href = _sign_single_url(asset.href, siblings=siblings)
     return asset
 
 
 @sign.register(ItemCollection)
 def sign_item_collection(
-    item_collection: ItemCollection, copy: bool = True
+    item_collection: ItemCollection, copy: bool | CopyStrategy = True
 ) -> ItemCollection:
     """Sign a PySTAC item collection.
 
     Args:
         item_collection (ItemCollection): The ItemCollection whose assets will
             be signed
-        copy (bool): Whether to copy (clone) the ItemCollection or mutate it
-            inplace.
+        copy (bool | CopyStrategy): Whether to copy (clone) the
+            ItemCollection or mutate it inplace. With `CopyStrategy.ASSETS`,
+            only the assets of the items are copied.
 
     Returns:
         ItemCollection: An ItemCollection where all assets'
@@ -334,7 +476,13 @@ def sign_item_collection(
         indicating the earliest expiry time for any assets that were signed.
 
     """
-    if copy:
+    if copy == CopyStrategy.ASSETS:
+        item_collection = ItemCollection(
+            [_copy_stac_object(item, copy=copy) for item in item_collection],
+            extra_fields=item_collection.extra_fields,
+            clone_items=False,
+        )
+    elif copy:
         item_collection = item_collection.clone()
     urls = [asset.href for item in item_collection for asset in item.assets.values()]
     signed_urls = sign_urls(urls=urls)
@@ -360,33 +508,82 @@ def _search_and_sign(search: ItemSearch, copy: bool = True) -> ItemCollection:
             properties indicating the earliest expiry time for any assets that
             were signed.
 
+    """
+    return ItemCollection(list(sign_iter(search)))
+
+
+def sign_iter(search: ItemSearch, prefetch: int = 1) -> Iterator[Item]:
+    """Perform a PySTAC Client search, and yield the signed items.
+
+    Items are signed one page at a time. While the items of a page are
+    yielded, the next pages are fetched and signed in a background thread,
+    so that at most `prefetch` signed pages are waiting to be consumed.
+
+    Args:
+        search (ItemSearch): The ItemSearch whose resulting item assets will
+            be signed
+        prefetch (int): Number of pages fetched and signed in advance
+
+    Yields:
+        Item: The resulting items of the search, where all assets' HREFs have
+            been replaced with a signed version.
+
     """
     if pystac_client.__version__ >= "0.5.0":
-        items = search.item_collection()
+        pages = search.pages()
     else:
-        items = search.get_all_items()
-    return sign(items)
+        pages = search.get_item_collections()  # pragma: no cover
+    queue: Queue = Queue(maxsize=prefetch)
+    stop = threading.Event()
+
+    def _put(obj: Any):
+        """Put in queue, unless the consumer has stopped."""
+        while not stop.is_set():
+            try:
+                queue.put(obj, timeout=0.1)
+                return
+            except Full:
+                continue
+
+    def _produce():
+        """Fetch and sign the pages."""
+        try:
+            for page in pages:
+                if stop.is_set():
+                    return
+                log.debug("Signing a page of %s items", len(page))
+                _put(sign_item_collection(page, copy=False))
+            _put(None)
+        except Exception as err:
+            _put(err)
+
+    thread = threading.Thread(target=_produce, name="tld-sign-iter", daemon=True)
+    thread.start()
+    try:
+        while (page := queue.get()) is not None:
+            if isinstance(page, Exception):
+                raise page
+            yield from page
+    finally:
+        stop.set()
 
 
 @sign.register(Collection)
-def sign_collection(collection: Collection, copy: bool = True) -> Collection:
+def sign_collection(
+    collection: Collection, copy: bool | CopyStrategy = True
+) -> Collection:
     """Sign a collection.
 
     Args:
         collection: STAC Collection
-        copy: copy or not the input
+        copy: copy or not the input. With `CopyStrategy.ASSETS`, only the
+            assets are copied.
 
     Returns:
         signed (Collection): the STAC collection, now with signed URLs.
 
     """
-    if copy:
-        # https://github.com/stac-utils/pystac/pull/834 fixed asset dropping
-        assets = collection.assets
-        collection = collection.clone()
-        if assets and not collection.assets:
-            collection.assets = deepcopy(assets)
-
+    collection = _copy_stac_object(collection, copy=copy)
     urls = [collection.assets[key].href for key in collection.assets]
     signed_urls = sign_urls(urls=urls)
     for key, asset in collection.assets.items():
@@ -395,7 +592,7 @@ def sign_collection(collection: Collection, copy: bool = True) -> Collection:
 
 
 @sign.register(collections.abc.Mapping)
-def sign_mapping(mapping: Mapping, copy: bool = True) -> Mapping:
+def sign_mapping(mapping: Mapping, copy: bool | CopyStrategy = True) -> Mapping:
     """Sign a mapping.
 
     Args:
@@ -411,135 +608,357 @@ def sign_mapping(mapping: Mapping, copy: bool = True) -> Mapping:
             * STAC ItemCollections
 
         copy: Whether to copy (clone) the mapping or mutate it inplace.
+            With `CopyStrategy.ASSETS`, STAC items, collections and
+            ItemCollections are not deep-copied: only the containers of the
+            assets are copied, and the other values (e.g. geometry) are
+            shared with the input mapping.
 
     Returns:
         signed (Mapping): The dictionary, now with signed URLs.
 
     """
+    is_kerchunk = all(key in mapping for key in ["version", "templates", "refs"])
+    if not is_kerchunk:
+        # Fast path for STAC objects, e.g. pages of pystac_client searches
+        mapping_type = mapping.get("type")
+        if mapping_type in ("Feature", "Collection", "FeatureCollection"):
+            assets_only = copy == CopyStrategy.ASSETS
+            if copy and not assets_only:
+                mapping = deepcopy(mapping)
+            if mapping_type != "FeatureCollection":
+                return _sign_stac_dicts([mapping], copy=assets_only)[0]
+            features = _sign_stac_dicts(mapping.get("features") or [], assets_only)
+            return {**mapping, "features": features} if assets_only else mapping
+
     if copy:
         mapping = deepcopy(mapping)
 
     types = (STACObjectType.ITEM, STACObjectType.COLLECTION)
-    if all(key in mapping for key in ["version", "templates", "refs"]):
+    if is_kerchunk:
         urls = list(mapping["templates"].values())
         signed_urls = sign_urls(urls=urls)
         for key, url in mapping["templates"].items():
             mapping["templates"][key] = signed_urls[url]
 
     elif identify_stac_object_type(cast(Dict[str, Any], mapping)) in types:
-        urls = [val["href"] for val in mapping["assets"].values()]
-        signed_urls = sign_urls(urls=urls)
-        for val in mapping["assets"].values():
-            url = val["href"]
-            val["href"] = signed_urls[url]
-
-    elif mapping.get("type") == "FeatureCollection" and mapping.get("features"):
-        urls = [
-            val["href"]
-            for feat in mapping["features"]
-            for val in feat.get("assets", {}).values()
-        ]
-        signed_urls = sign_urls(urls=urls)
-        for feature in mapping["features"]:
-            for val in feature.get("assets", {}).values():
-                url = val["href"]
-                val["href"] = signed_urls[url]
+        _sign_stac_dicts([mapping], copy=False)
 
     return mapping
 
 
+def _sign_stac_dicts(stac_dicts: list, copy: bool) -> list:
+    """Sign the assets of STAC items or collections dicts.
+
+    Args:
+        stac_dicts: STAC items or collections, as dicts
+        copy: Whether to copy the dicts holding the assets, or mutate them
+            inplace.
+
+    Returns:
+        the signed STAC items or collections
+
+    """
+    assets = []
+    signed_stac_dicts = []
+    for stac_dict in stac_dicts:
+        if copy:
+            stac_dict = {**stac_dict}
+            if "assets" in stac_dict:
+                stac_dict["assets"] = {
+                    key: {**asset} for key, asset in stac_dict["assets"].items()
+                }
+        signed_stac_dicts.append(stac_dict)
+        assets.extend(stac_dict.get("assets", {}).values())
+    if assets:
+        signed_urls = sign_urls(urls=[asset["href"] for asset in assets])
+        for asset in assets:
+            asset["href"] = signed_urls[asset["href"]]
+    return signed_stac_dicts
+
+
 sign_reference_file = sign_mapping
 
 
-def _generic_get_signed_urls(
-    urls: list[str],
-    route: SignURLRoute,
-) -> Dict[str, SignedURL]:
-    """Get multiple signed URLs.
+def _store_signed_url_batches(
+    signed_url_batches: list[SignedURLBatch], route: SignURLRoute
+) -> Dict[str, CacheEntry]:
+    """Put the signed URLs of the batches in cache (GET URLs only).
 
-    This will use the URL from the cache if it's present and not too close
-    to expiring. The generated URL will be placed in the cache.
+    Args:
+        signed_url_batches: signed URL batches
+        route: route (API)
+
+    Returns:
+        dict of SignedURL: key = original URL, value = signed URL
+
+    """
+    signed_urls: Dict[str, CacheEntry] = {}
+    for signed_url_batch in signed_url_batches:
+        # The URLs of a batch share the same expiry
+        expires_at = int(signed_url_batch.expiry.timestamp())
+        for url, href in signed_url_batch.hrefs.items():
+            signed_urls[url] = CachedSignedURL(url, href, expires_at)
+    if route == SignURLRoute.SIGN_URLS_GET:
+        # Only put GET urls in cache
+        CACHE.update(signed_urls)
+        if disk_cache := get_disk_cache():
+            disk_cache.put_many(
+                {
+                    url: (signed_url.href, signed_url.expires_at)
+                    for url, signed_url in signed_urls.items()
+                }
+            )
+    return signed_urls
+
+
+def _request_signed_urls(
+    urls: list[str], route: SignURLRoute
+) -> Dict[str, CacheEntry]:
+    """Sign URLs with the signing endpoint, bypassing the cache.
+
+    The generated GET URLs are placed in the cache.
 
     Args:
         urls: urls
         route: route (API)
 
     Returns:
-        SignedURL: the signed URL
+        dict of SignedURL: key = original URL, value = signed URL
 
     """
-    # pylint: disable=too-many-statements
-    # pylint: disable=too-many-locals
-    # pylint: disable=too-many-branches
-    log.debug("Get signed URLs for %s", urls)
-    start_time = time.time()
+    signed_url_batches = _dispatch_chunks(chunks=_make_chunks(urls), route=route)
+    return _store_signed_url_batches(signed_url_batches, route=route)
 
-    signed_urls = {}
-    for url in urls:
-        if route != SignURLRoute.SIGN_URLS_GET:
-            # For write access, we don't filter out URLs.
-            continue
-        # Check if the URL is already in the cache
-        if signed_url_in_cache := CACHE.get(url):
-            log.debug("URL %s already in cache", url)
-            ttl = signed_url_in_cache.ttl()
-            log.debug("Cached URL %s TTL is %s seconds", url, ttl)
-            if ttl > ENV.tld_ttl_margin:
-                log.debug(
-                    "Using cache (%s > %s)",
-                    ttl,
-                    ENV.tld_ttl_margin,
-                )
-                signed_urls[url] = signed_url_in_cache
-        # If the URL is not in the cache, check if it is already signed
+
+def _get_cached(url: str) -> CacheEntry | None:
+    """Return the cached signed URL, if not too close to expiring."""
+    if signed_url_in_cache := CACHE.get(url):
+        log.debug("URL %s already in cache", url)
+        ttl = signed_url_in_cache.ttl()
+        log.debug("Cached URL %s TTL is %s seconds", url, ttl)
+        if ttl > ENV.tld_ttl_margin:
+            log.debug(
+                "Using cache (%s > %s)",
+                ttl,
+                ENV.tld_ttl_margin,
+            )
+            return signed_url_in_cache
+    return None
+
+
+class URLBuckets(NamedTuple):
+    """GET URLs to sign, classified without duplicates."""
+
+    foreign: list[str]
+    already_signed: Dict[str, SignedURL]
+    cached: Dict[str, CacheEntry]
+    to_sign: list[str]
+
+
+def _classify_urls(urls: list[str], check_domain: bool = True) -> URLBuckets:
+    """Classify GET URLs in a single pass, removing duplicates.
+
+    URLs are classified as foreign (outside the storage domain, left
+    unmodified), already signed (and still valid), cached, or to sign.
+    URLs to sign are looked up in the disk cache, if enabled.
+
+    Args:
+        urls: urls
+        check_domain: whether URLs outside the storage domain are foreign
+
+    Returns:
+        URLBuckets: the classified URLs
+
+    """
+    buckets = URLBuckets(foreign=[], already_signed={}, cached={}, to_sign=[])
+    expired = set()
+    min_expiry = time.time() + ENV.tld_ttl_margin
+    for url in dict.fromkeys(urls):
+        if check_domain and not _is_storage_url(url):
+            # Outside our domain
+            buckets.foreign.append(url)
+        # elif parsed_url.netloc == "????":
+        #     # special case for public assets storing thumbnails...
+        #     return url
+        elif (signed_url_in_cache := CACHE.get(url)) is not None:
+            # Use the cached URL, if not too close to expiring
+            if signed_url_in_cache.expires_at > min_expiry:
+                buckets.cached[url] = signed_url_in_cache
+            else:
+                expired.add(url)
+                buckets.to_sign.append(url)
+        elif (expiry := _parse_signed_url_expiry(url)) is not None and (
+            expiry.timestamp() >= min_expiry
+        ):
+            # Already signed, and not too close to expiring
+            buckets.already_signed[url] = SignedURL.model_construct(
+                expiry=expiry, href=url
+            )
         else:
-            try:
-                signed_urls[url] = SignedURL.from_already_signed(url)
-                log.debug("Reusing the signing URL because it's still valid.")
-            except (NotSignedURL, ExpiredSignedURL) as err:
-                log.debug("The existing URL cannot be reused (%s)", err)
-    not_signed_urls = [url for url in urls if url not in signed_urls]
-    log.debug("Already signed URLs:\n %s", signed_urls)
-    log.debug("Not signed URLs:\n %s", not_signed_urls)
-
-    if not_signed_urls:
-        # Refresh the token if there's less than
-        # `settings.teledetection_ttl_margin seconds` remaining, in order to
-        # give a small amount of time to do stuff with the url
-        n_urls = len(not_signed_urls)
-        log.debug("Number of URLs to sign: %s", n_urls)
-        n_chunks = math.ceil(n_urls / MAX_URLS)
-        log.debug("Number of chunks of URLs to sign: %s", n_chunks)
-        for i_chunk in range(n_chunks):
-            log.debug("Processing chunk %s/%s", i_chunk + 1, n_chunks)
-            chunk_start = i_chunk * MAX_URLS
-            chunk_end = min(chunk_start + MAX_URLS, n_urls)
-            not_signed_urls_chunk = not_signed_urls[chunk_start:chunk_end]
-            params: Dict[str, Any] = {"urls": not_signed_urls_chunk}
-            if ENV.tld_url_duration:
-                params["duration_seconds"] = ENV.tld_url_duration
-            response = session.post(route=route.value, params=params)
-            signed_url_batch = SignedURLBatch(**response.json())
-            if not signed_url_batch:
-                raise ValueError(
-                    f"No signed url batch found in response: {response.json()}"
-                )
-            if not all(key in signed_url_batch.hrefs for key in not_signed_urls_chunk):
-                raise ValueError(
-                    f"URLs to sign are {not_signed_urls_chunk} but returned "
-                    f"signed URLs"
-                    f"are for {signed_url_batch.hrefs.keys()}"
-                )
-            for url, href in signed_url_batch.hrefs.items():
-                signed_url = SignedURL(expiry=signed_url_batch.expiry, href=href)
-                if route == SignURLRoute.SIGN_URLS_GET:
-                    # Only put GET urls in cache
-                    CACHE[url] = signed_url
-                signed_urls[url] = signed_url
+            buckets.to_sign.append(url)
+
+    n_memory_hits = len(buckets.cached)
+    if buckets.to_sign and (disk_cache := get_disk_cache()):
+        # Look up URLs signed by other processes, and put them in memory
+        for url, (href, expires_at) in disk_cache.get_many(buckets.to_sign).items():
+            buckets.cached[url] = CACHE[url] = CachedSignedURL(
+                url, href, int(expires_at)
+            )
+        buckets.to_sign[:] = [u for u in buckets.to_sign if u not in buckets.cached]
+    n_expired = len(expired.intersection(buckets.to_sign)) if expired else 0
+    for outcome, count in (
+        ("foreign", len(buckets.foreign)),
+        ("already_signed", len(buckets.already_signed)),
+        ("cache_hit", n_memory_hits),
+        ("disk_cache_hit", len(buckets.cached) - n_memory_hits),
+        ("expired", n_expired),
+        ("miss", len(buckets.to_sign) - n_expired),
+    ):
+        if count:
+            SIGNING_URLS.inc(outcome, amount=count)
+    log.debug(
+        "URLs: %s foreign, %s already signed, %s cached, %s to sign",
+        len(buckets.foreign),
+        len(buckets.already_signed),
+        len(buckets.cached),
+        len(buckets.to_sign),
+    )
+    return buckets
+
+
+def _get_signed_buckets(buckets: URLBuckets) -> Dict[str, CacheEntry]:
+    """Sign the classified GET URLs (foreign URLs excepted).
+
+    Args:
+        buckets: classified URLs
+
+    Returns:
+        dict of SignedURL: key = original URL, value = signed URL
+
+    """
+    start_time = time.time()
+    signed_urls = {**buckets.already_signed, **buckets.cached}
+    if buckets.to_sign:
+        try:
+            signed_urls.update(_single_flight_signed_urls(buckets.to_sign))
+        except Exception as err:
+            signed_urls.update(_serve_stale(buckets.to_sign, err, CACHE))
         log.debug(
             "Got signed urls %s in %s seconds",
             signed_urls,
             f"{time.time() - start_time:.2f}",
         )
+    _track_used(signed_urls)
+    return signed_urls
+
+
+def _claim_in_flight(
+    urls: list[str],
+) -> tuple[Dict[str, CacheEntry], Dict[str, Future], Dict[str, Future]]:
+    """Claim the GET URLs to sign that no other thread or task is signing.
+
+    Args:
+        urls: urls
+
+    Returns:
+        the URLs signed meanwhile (key = original URL, value = signed URL),
+        the claimed URLs and the URLs signed elsewhere (key = original URL,
+        value = future signed URL)
 
+    """
+    signed_urls: Dict[str, CacheEntry] = {}
+    owned: Dict[str, Future] = {}
+    awaited: Dict[str, Future] = {}
+    with _IN_FLIGHT_LOCK:
+        for url in urls:
+            if future := _IN_FLIGHT.get(url):
+                awaited[url] = future
+            elif url in CACHE and (signed_url := _get_cached(url)):
+                # Signed by another thread since the cache lookup
+                signed_urls[url] = signed_url
+            elif url not in owned:
+                owned[url] = _IN_FLIGHT[url] = Future()
+    log.debug("Awaiting %s URLs signed by other threads", len(awaited))
+    return signed_urls, owned, awaited
+
+
+def _release_in_flight(
+    owned: Dict[str, Future],
+    signed_urls: Dict[str, CacheEntry] | None = None,
+    err: BaseException | None = None,
+):
+    """Release claimed URLs, and share their result (or error)."""
+    for url, future in owned.items():
+        if future.done():
+            continue
+        if signed_urls is not None:
+            future.set_result(signed_urls[url])
+        else:
+            future.set_exception(cast(BaseException, err))
+    with _IN_FLIGHT_LOCK:
+        for url in owned:
+            _IN_FLIGHT.pop(url, None)
+
+
+def _single_flight_signed_urls(urls: list[str]) -> Dict[str, CacheEntry]:
+    """Sign GET URLs, sharing in-flight requests between threads.
+
+    URLs that another thread is already signing are not requested again:
+    their result is awaited instead.
+
+    Args:
+        urls: urls
+
+    Returns:
+        dict of SignedURL: key = original URL, value = signed URL
+
+    """
+    signed_urls, owned, awaited = _claim_in_flight(urls)
+    if owned:
+        try:
+            new_signed_urls = _request_signed_urls(
+                urls=list(owned), route=SignURLRoute.SIGN_URLS_GET
+            )
+        except BaseException as err:
+            _release_in_flight(owned, err=err)
+            raise
+        _release_in_flight(owned, signed_urls=new_signed_urls)
+        signed_urls.update(new_signed_urls)
+
+    for url, future in awaited.items():
+        signed_urls[url] = future.result()
     return signed_urls
+
+
+def _track_used(signed_urls: Dict[str, CacheEntry]):
+    """Record the use of signed GET URLs, for the refresh-ahead."""
+    if ENV.tld_refresh_ahead:
+        start_refresh_ahead()
+    if REFRESHER.running:
+        REFRESHER.touch(signed_urls)
+
+
+def _generic_get_signed_urls(
+    urls: list[str],
+    route: SignURLRoute,
+) -> Dict[str, CacheEntry]:
+    """Get multiple signed URLs.
+
+    This will use the URL from the cache if it's present and not too close
+    to expiring. The generated URL will be placed in the cache.
+    This is thread-safe: URLs being signed by another thread are not
+    requested twice.
+
+    Args:
+        urls: urls
+        route: route (API)
+
+    Returns:
+        SignedURL: the signed URL
+
+    """
+    log.debug("Get signed URLs for %s", urls)
+    if route != SignURLRoute.SIGN_URLS_GET:
+        # For write access, we don't filter out URLs.
+        return _request_signed_urls(urls=urls, route=route) if urls else {}
+    return _get_signed_buckets(_classify_urls(urls, check_domain=False))
@@ -0,0 +1,168 @@
+"""Access to the storage through URLs signed on the fly."""
+
+import re
+import threading
+import time
+from typing import Dict
+
+import requests
+
+from . import signing
+from .logger import get_logger_for
+from .settings import ENV, S3_STORAGE_DOMAIN
+from .utils import create_session
+
+log = get_logger_for(__name__)
+
+DEFAULT_STORAGE_ENDPOINT = f"https://s3-data.{S3_STORAGE_DOMAIN}"
+# A URL denied by the storage is signed again at most once in this period
+RESIGN_PERIOD = 60
+# Number of URLs above which the re-sign dates of past periods are dropped
+RESIGN_PRUNE_SIZE = 10_000
+
+content_range_xpr = re.compile(r"bytes (?:\d+-\d+|\*)/(?P<size>\d+)")
+
+
+class StorageClient:
+    """HTTP client for the storage, signing URLs on the fly.
+
+    URLs are signed through the SDK cache, so that they are only re-signed
+    when close to expiring. When the storage still answers 403 (e.g. the
+    signature was revoked), the URL is signed again, bypassing the cache, and
+    the request is sent once more. This happens at most once per URL every
+    `RESIGN_PERIOD` seconds, so that objects that are really forbidden don't
+    cost a signing request each time. Connections are pooled and kept alive.
+
+    URLs are signed for GET only: HEAD requests are emulated with a GET of
+    the first byte.
+    """
+
+    def __init__(self, pool_maxsize: int = 32):
+        """Initialize.
+
+        Args:
+            pool_maxsize: number of pooled connections per host
+
+        """
+        self.session = create_session(pool_maxsize=pool_maxsize)
+        # Key is the URL, value is the date it was last signed again
+        self._resigned: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def sign(self, url: str, refresh: bool = False) -> str:
+        """Sign a storage URL.
+
+        The URL is signed even if it is not in the storage domain, so that
+        other S3 endpoints (e.g. for tests) can be used.
+
+        Args:
+            url: unsigned URL
+            refresh: bypass the cache, and replace the cached URL
+
+        Returns:
+            signed URL
+
+        """
+        route = signing.SignURLRoute.SIGN_URLS_GET
+        if refresh:
+            signing.CACHE.pop(url, None)
+            return signing._request_signed_urls(  # pylint: disable=W0212
+                urls=[url], route=route
+            )[url].href
+        return signing._generic_get_signed_urls(  # pylint: disable=W0212
+            urls=[url], route=route
+        )[url].href
+
+    def _claim_resign(self, url: str) -> bool:
+        """Whether a denied URL can be signed again now."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._resigned.get(url, -RESIGN_PERIOD) < RESIGN_PERIOD:
+                return False
+            if len(self._resigned) > RESIGN_PRUNE_SIZE:
+                self._resigned = {
+                    key: date
+                    for key, date in self._resigned.items()
+                    if now - date < RESIGN_PERIOD
+                }
+            self._resigned[url] = now
+            return True
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        headers: Dict[str, str] | None = None,
+        stream: bool = False,
+    ) -> requests.Response:
+        """Send a request to the storage, with a signed URL.
+
+        Args:
+            method: HTTP method ("GET", or "HEAD" which is emulated, see
+                `head()`)
+            url: unsigned URL
+            headers: request headers (e.g. "Range")
+            stream: do not read the response body right away
+
+        Returns:
+            response of the storage
+
+        """
+        if method == "HEAD":
+            return self.head(url, headers=headers)
+        response = self.session.request(
+            method,
+            self.sign(url),
+            headers=headers,
+            stream=stream,
+            timeout=ENV.tld_request_timeout,
+        )
+        if response.status_code == 403 and self._claim_resign(url):
+            log.debug("Access denied to %s, signing it again", url)
+            response.close()
+            response = self.session.request(
+                method,
+                self.sign(url, refresh=True),
+                headers=headers,
+                stream=stream,
+                timeout=ENV.tld_request_timeout,
+            )
+        return response
+
+    def head(
+        self, url: str, headers: Dict[str, str] | None = None
+    ) -> requests.Response:
+        """Emulate a HEAD request, with a GET of the first byte.
+
+        The response has the status and headers a HEAD request would get: the
+        `Content-Length` is the size of the object, and there is no body.
+
+        Args:
+            url: unsigned URL
+            headers: request headers (a "Range" header is replaced)
+
+        Returns:
+            response of the storage
+
+        """
+        headers = {
+            **{k: v for k, v in (headers or {}).items() if k.lower() != "range"},
+            "Range": "bytes=0-0",
+        }
+        response = self.request("GET", url, headers=headers)
+        if response.status_code == 206:
+            match = content_range_xpr.fullmatch(
+                response.headers.get("Content-Range", "")
+            )
+            size = match.group("size") if match else "0"
+        elif response.status_code == 416:
+            # Empty object
+            size = "0"
+        else:
+            return response
+        response.status_code = 200
+        response.reason = "OK"
+        response.headers.pop("Content-Range", None)
+        response.headers["Content-Length"] = size
+        response._content = b""  # pylint: disable = protected-access
+        return response
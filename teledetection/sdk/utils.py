@@ -5,16 +5,36 @@ import urllib3.util.retry
 
 from .settings import ENV
 
+RETRY_STATUSES = (429, 500, 502, 503, 504)
 
-def create_session():
-    """Create a session for requests."""
+
+def create_session(
+    pool_maxsize: int | None = None,
+    retry_statuses: tuple = RETRY_STATUSES,
+    connect_retries: int | None = None,
+):
+    """Create a session for requests.
+
+    Args:
+        pool_maxsize: number of pooled connections per host (defaults to one
+            per concurrent signing worker, at least 10)
+        retry_statuses: HTTP statuses retried with an exponential backoff
+        connect_retries: number of retries of connection errors (defaults to
+            `ENV.tld_retry_total`)
+
+    """
     session = requests.Session()
     retry = urllib3.util.retry.Retry(
         total=ENV.tld_retry_total,
+        connect=connect_retries,
         backoff_factor=ENV.tld_retry_backoff_factor,
-        status_forcelist=[429, 500, 502, 503, 504],
+        status_forcelist=list(retry_statuses),
+    )
+    # Keep one pooled connection per concurrent signing worker
+    adapter = requests.adapters.HTTPAdapter(
+        max_retries=retry,
+        pool_maxsize=pool_maxsize or max(10, ENV.tld_signing_workers),
     )
-    adapter = requests.adapters.HTTPAdapter(max_retries=retry)
     session.mount("http://", adapter)
     session.mount("https://", adapter)
 
@@ -0,0 +1,136 @@
+"""Local stand-ins for the signing endpoint and the storage, used in offline tests."""
+
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks.fake_server import FakeSigningServer
+
+import teledetection
+from teledetection.sdk.http import BareConnectionMethod
+
+
+class FakeSigningEndpoint(FakeSigningServer):
+    """Fake signing endpoint, plugged on the SDK session while in context.
+
+    See :class:`benchmarks.fake_server.FakeSigningServer`.
+    """
+
+    def __init__(self, duration: int = 3600, delay: float = 0.0, **kwargs):
+        """Initialize, on a free port."""
+        super().__init__(duration=duration, delay=delay, **kwargs)
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    def __enter__(self):
+        """Start serving and plug the SDK session on the endpoint."""
+        self.thread.start()
+        http = teledetection.sdk.http
+        self._previous_method = http.session._method  # pylint: disable=W0212
+        http.session._method = BareConnectionMethod(  # pylint: disable=W0212
+            endpoint=self.endpoint
+        )
+        teledetection.sdk.signing.CACHE.clear()
+        teledetection.sdk.dispatch.BREAKER.reset()
+        return self
+
+    def __exit__(self, *args):
+        """Stop serving and restore the SDK session."""
+        http = teledetection.sdk.http
+        http.session._method = self._previous_method  # pylint: disable=W0212
+        teledetection.sdk.signing.CACHE.clear()
+        self.shutdown()
+        self.server_close()
+
+
+class FakeStorage:
+    """Storage serving files (with range requests) to signed URLs only.
+
+    URLs without a signature, or signed for another method (signatures of
+    `FakeSigningEndpoint` end with "-put" for PUT, and are for GET otherwise)
+    are denied (403), as well as the next `deny_next` requests. Every received
+    request is recorded in `requests` as a tuple (method, path, range header).
+    """
+
+    def __init__(self, files: dict[str, bytes]):
+        """Initialize with a dict of file contents, with paths as keys."""
+        self.files = files
+        self.requests: list[tuple[str, str, str | None]] = []
+        self.deny_next = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def endpoint(self) -> str:
+        """Base URL of the storage."""
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def _handler(self):
+        """Create the request handler class."""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Request handler."""
+
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):  # pylint: disable=arguments-differ
+                """Silence the server."""
+
+            def _reply(self, method: str):
+                """Serve the file."""
+                parsed = urlsplit(self.path)
+                range_header = self.headers.get("Range")
+                with fake.lock:
+                    fake.requests.append((method, parsed.path, range_header))
+                    signature = parse_qs(parsed.query).get("X-Amz-Signature", [""])[0]
+                    signed_method = "PUT" if signature.endswith("-put") else "GET"
+                    deny = (
+                        fake.deny_next > 0
+                        or not signature
+                        or method != signed_method
+                    )
+                    fake.deny_next -= int(fake.deny_next > 0)
+                status, headers, body = 200, {}, b""
+                if deny:
+                    status = 403
+                elif parsed.path not in fake.files:
+                    status = 404
+                else:
+                    body = fake.files[parsed.path]
+                    headers["Accept-Ranges"] = "bytes"
+                    if range_header:
+                        match = re.fullmatch(r"bytes=(\d+)-(\d*)", range_header)
+                        start = int(match.group(1))
+                        end = int(match.group(2) or len(body) - 1)
+                        headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+                        body = body[start : end + 1]
+                        status = 206
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if method == "GET":
+                    self.wfile.write(body)
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                """Handle GET requests."""
+                self._reply("GET")
+
+            def do_HEAD(self):  # pylint: disable=invalid-name
+                """Handle HEAD requests."""
+                self._reply("HEAD")
+
+        return Handler
+
+    def __enter__(self):
+        """Start serving."""
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        """Stop serving."""
+        self.server.shutdown()
+        self.server.server_close()
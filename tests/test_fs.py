@@ -0,0 +1,45 @@
+"""fsspec filesystem tests, with local stand-ins for the endpoint and storage."""
+
+import pytest
+import requests
+
+from fake_endpoint import FakeSigningEndpoint, FakeStorage
+
+fsspec = pytest.importorskip("fsspec")
+
+DATA = bytes(range(256)) * 100
+
+
+def test_filesystem():
+    """Test reads, range reads, and re-signing."""
+    files = {"/bucket/a.bin": DATA, "/bucket/b.bin": DATA[::-1]}
+    with FakeSigningEndpoint() as fake, FakeStorage(files) as storage:
+        fs = fsspec.filesystem(
+            "tld", storage_endpoint=storage.endpoint, skip_instance_cache=True
+        )
+        assert fs.size("tld://bucket/a.bin") == len(DATA)
+        # URLs are signed for GET: the size is read from a range request
+        assert storage.requests[-1] == ("GET", "/bucket/a.bin", "bytes=0-0")
+        signed_url = fs.client.sign(fs.url("bucket/a.bin"))
+        assert requests.head(signed_url, timeout=10).status_code == 403
+        assert fs.cat_file("tld://bucket/a.bin", 10, 20) == DATA[10:20]
+        assert fs.cat_file("bucket/a.bin", -5) == DATA[-5:]
+        with fs.open("tld://bucket/a.bin", block_size=1000) as file_handle:
+            file_handle.seek(5000)
+            assert file_handle.read(10) == DATA[5000:5010]
+        assert len(fake.requests) == 1
+
+        # Ranges are fetched in parallel, after signing all URLs at once
+        paths = ["bucket/a.bin", "bucket/b.bin", "bucket/missing.bin"]
+        ranges = fs.cat_ranges(paths, [0, 0, 0], [4, 4, 4])
+        assert ranges[:2] == [DATA[:4], DATA[::-1][:4]]
+        assert isinstance(ranges[2], FileNotFoundError)
+        assert len(fake.requests) == 2
+        assert len(fake.requests[1][1]) == 2
+
+        # Denied signed URLs are signed again
+        storage.deny_next = 1
+        assert fs.cat_file("tld://bucket/b.bin") == DATA[::-1]
+        assert len(fake.requests) == 3
+        # Only the HEAD request of the test reached the storage
+        assert [method for method, _, _ in storage.requests].count("HEAD") == 1
@@ -0,0 +1,68 @@
+"""Signing proxy tests, with local stand-ins for the endpoint and storage."""
+
+import socket
+import threading
+
+import requests
+
+from fake_endpoint import FakeSigningEndpoint, FakeStorage
+
+from teledetection.sdk import dispatch
+from teledetection.sdk.proxy import SigningProxy
+from teledetection.sdk.settings import ENV
+
+DATA = bytes(range(256)) * 100
+
+
+def test_proxy(monkeypatch):
+    """Test range requests and re-signing through the proxy."""
+    files = {"/bucket/a.tif": DATA}
+    with FakeSigningEndpoint() as fake, FakeStorage(files) as storage, SigningProxy(
+        port=0, storage_endpoint=storage.endpoint
+    ) as proxy:
+        threading.Thread(target=proxy.serve_forever, daemon=True).start()
+        url = f"{proxy.url}/bucket/a.tif"
+        with requests.Session() as session:
+            response = session.get(url, headers={"Range": "bytes=10-19"})
+            assert response.status_code == 206
+            assert response.content == DATA[10:20]
+            assert response.headers["Content-Range"] == f"bytes 10-19/{len(DATA)}"
+
+            # HEAD requests are sent as GET requests, as URLs are signed for GET
+            response = session.head(url)
+            assert response.status_code == 200
+            assert int(response.headers["Content-Length"]) == len(DATA)
+            assert storage.requests[-1] == ("GET", "/bucket/a.tif", "bytes=0-0")
+
+            # The URL is signed once, then served from the cache
+            assert len(fake.requests) == 1
+            assert fake.requests[0][1] == [f"{storage.endpoint}/bucket/a.tif"]
+
+            # Denied signed URLs are signed again
+            storage.deny_next = 1
+            assert session.get(url).content == DATA
+            assert len(fake.requests) == 2
+
+            # ... but not again right after
+            storage.deny_next = 2
+            assert session.get(url).status_code == 403
+            assert len(fake.requests) == 2
+            storage.deny_next = 0
+
+            assert session.get(f"{proxy.url}/bucket/missing.tif").status_code == 404
+
+            # Request targets that are not paths are never signed
+            n_requests = len(fake.requests)
+            for target in ("@example.com/x", "http://example.com/x"):
+                with socket.create_connection(proxy.server_address[:2]) as sock:
+                    request = f"GET {target} HTTP/1.1\r\nHost: x\r\n\r\n"
+                    sock.sendall(request.encode())
+                    assert sock.recv(1024).startswith(b"HTTP/1.1 400")
+            assert len(fake.requests) == n_requests
+
+            # The signing endpoint is unavailable
+            monkeypatch.setattr(ENV, "tld_breaker_failures", 1)
+            fake.fail_next, fake.fail_status = 1, 503
+            assert session.get(f"{proxy.url}/bucket/b.tif").status_code == 503
+            dispatch.BREAKER.reset()
+        proxy.shutdown()
@@ -0,0 +1,717 @@
+"""Offline signing tests, against a local stand-in for the signing endpoint."""
+
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import httpx
+import requests
+import urllib3
+from pystac import Asset, Item, ItemCollection
+
+from fake_endpoint import FakeSigningEndpoint
+from utils import should_fail
+
+import teledetection
+from teledetection.sdk import (
+    batching,
+    breaker,
+    dispatch,
+    expiry,
+    files,
+    http,
+    metrics,
+    ratelimit,
+    signing,
+)
+from teledetection.sdk.cache import CachedSignedURL, MemoryCache, get_disk_cache
+from teledetection.sdk.http import BareConnectionMethod
+from teledetection.sdk.oauth2 import retrieve_token_endpoint
+from teledetection.sdk.settings import ENV, MAX_URLS
+
+
+def _urls(n: int) -> list[str]:
+    """Return `n` distinct storage URLs."""
+    return [f"https://s3-data.meso.umontpellier.fr/bucket/{i}.tif" for i in range(n)]
+
+
+def test_token_endpoint(monkeypatch):
+    """Test that the token endpoint is read from the OpenAPI description."""
+    with FakeSigningEndpoint() as fake:
+        monkeypatch.setattr(ENV, "tld_signing_endpoint", fake.endpoint)
+        assert retrieve_token_endpoint() == f"{fake.endpoint}token"
+
+
+def test_concurrent_chunks(monkeypatch):
+    """Test that chunks are sent concurrently and keep their order."""
+    urls = _urls(5 * MAX_URLS + 3)
+    n_get_headers = []
+    get_headers = BareConnectionMethod.get_headers
+    monkeypatch.setattr(
+        BareConnectionMethod,
+        "get_headers",
+        lambda self: n_get_headers.append(1) or get_headers(self),
+    )
+    with FakeSigningEndpoint(delay=0.1) as fake:
+        in_flight, peak, lock = [], [], threading.Lock()
+        handle_signing = fake.handle_signing
+
+        def _handle_signing(*args):
+            with lock:
+                in_flight.append(1)
+                peak.append(len(in_flight))
+            try:
+                return handle_signing(*args)
+            finally:
+                with lock:
+                    in_flight.pop()
+
+        monkeypatch.setattr(fake, "handle_signing", _handle_signing)
+        signed = signing.sign_urls(urls)
+        assert max(peak) > 1
+        assert list(signed) == urls
+        assert all(signed[url].startswith(f"{url}?") for url in urls)
+        assert len(fake.requests) == 6
+        assert sorted(len(chunk) for _, chunk in fake.requests)[0] == 3
+    # The (OAuth2) headers are resolved once, not in each worker thread
+    assert len(n_get_headers) == 1
+
+
+def test_retry_failed_chunks_only(monkeypatch):
+    """Test that only the failed chunks are sent again."""
+    urls = _urls(3 * MAX_URLS)
+    with FakeSigningEndpoint() as fake:
+        fake.fail_next = 1
+        signing.sign_urls(urls)
+        assert len(fake.requests) == 4
+        assert fake.requests[-1][1] in [req[1] for req in fake.requests[:-1]]
+
+    monkeypatch.setattr(ENV, "tld_signing_chunk_retries", 0)
+    with FakeSigningEndpoint() as fake:
+        fake.fail_next = 1
+        should_fail(signing.sign_urls, [urls], requests.exceptions.HTTPError)
+
+
+def test_disk_cache(monkeypatch):
+    """Test that URLs signed by another process are reused from disk."""
+    urls = _urls(10)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        monkeypatch.setattr(ENV, "tld_disk_cache_dir", tmpdir)
+        monkeypatch.setattr(ENV, "tld_disk_cache", True)
+        with FakeSigningEndpoint() as fake:
+            signed = signing.sign_urls(urls)
+            # Simulate a new process: empty in-memory cache
+            signing.CACHE.clear()
+            resigned = signing.sign_urls(urls[:5])
+            assert resigned == {url: signed[url] for url in urls[:5]}
+            assert len(fake.requests) == 1
+
+            disk_cache = get_disk_cache()
+            assert disk_cache and os.path.dirname(disk_cache.path) == tmpdir
+            with monkeypatch.context() as patch:
+                patch.setattr(ENV, "tld_ttl_margin", fake.duration)
+                disk_cache.evict()
+            assert not disk_cache.get_many(urls)
+
+
+def test_memory_cache():
+    """Test the bounds and eviction of the in-memory cache."""
+    now = datetime.now(timezone.utc)
+    cache = MemoryCache(max_entries=3)
+    for i in range(5):
+        cache[str(i)] = signing.SignedURL(expiry=now + timedelta(hours=1), href="u")
+    assert list(cache) == ["2", "3", "4"]
+    assert cache.get("2") and not cache.get("0")
+    cache["3"] = signing.SignedURL(expiry=now - timedelta(seconds=1), href="u")
+    cache["5"] = signing.SignedURL(expiry=now + timedelta(hours=1), href="u")
+    assert list(cache) == ["4", "2", "5"]
+    assert cache.stats() == {
+        "entries": 3,
+        "bytes": cache.n_bytes,
+        "hits": 1,
+        "misses": 1,
+        "evictions": 2,
+        "expirations": 1,
+    }
+    assert MemoryCache(max_bytes=1000).stats()["bytes"] == 0
+
+    # Entries are stored in a compact form
+    expires = now + timedelta(hours=1)
+    cache["6"] = signing.SignedURL(expiry=expires, href="6?X-Amz-Signature=s")
+    entry = cache["6"]
+    assert isinstance(entry, CachedSignedURL) and entry.signature == "s"
+    assert entry.href == "6?X-Amz-Signature=s"
+    assert entry.expires_at == int(expires.timestamp())
+    assert cache.get("2").href == "u"
+
+
+def test_compact_cache():
+    """Test that the URLs signed together share their expiry and query."""
+    urls = _urls(3)
+    with FakeSigningEndpoint():
+        signed = signing.sign_urls(urls)
+        entries = [signing.CACHE[url] for url in urls]
+    assert [entry.href for entry in entries] == [signed[url] for url in urls]
+    assert entries[0].expires_at is entries[2].expires_at
+    assert entries[0].query is entries[2].query
+    assert entries[0].signature == "fake"
+    assert abs(entries[0].ttl() - 3600) < 2
+
+
+def test_single_flight():
+    """Test that concurrent threads never request the same URL twice."""
+    urls = _urls(100)
+    with FakeSigningEndpoint(delay=0.1) as fake:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(
+                executor.map(
+                    signing.sign_urls, [urls[i * 10 : i * 10 + 30] for i in range(8)]
+                )
+            )
+        requested = [url for _, chunk in fake.requests for url in chunk]
+        assert sorted(requested) == sorted(set(requested))
+        assert len(requested) == 100
+        assert all(
+            signed[url] == results[0].get(url, signed[url])
+            for signed in results
+            for url in signed
+        )
+
+
+def test_refresh_ahead(monkeypatch):
+    """Test the background re-signing of recently used URLs."""
+    urls = _urls(100)
+    with FakeSigningEndpoint() as fake:
+        signing.start_refresh_ahead()
+        signed = signing.sign_urls(urls)
+        signing.REFRESHER.refresh_once()
+        assert len(fake.requests) == 2
+
+        # URLs will soon be within the TTL margin (and are re-signed with
+        # another expiry, so that they differ from the first ones)
+        monkeypatch.setattr(ENV, "tld_refresh_ahead_lead", fake.duration)
+        fake.duration += 60
+        signing.REFRESHER.refresh_once()
+        signing.stop_refresh_ahead()
+        assert len(fake.requests) == 4
+        resigned = signing.sign_urls(urls)
+        assert len(fake.requests) == 4
+        assert all(resigned[url] != signed[url] for url in urls)
+
+
+def test_coalesce(monkeypatch):
+    """Test that single URLs signed by concurrent threads are batched."""
+    urls = _urls(40)
+    monkeypatch.setattr(ENV, "tld_coalesce", True)
+    monkeypatch.setattr(ENV, "tld_coalesce_window", 0.2)
+    with FakeSigningEndpoint() as fake:
+        with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+            signed = list(executor.map(signing.sign, urls))
+        assert all(href.startswith(f"{url}?") for url, href in zip(urls, signed))
+        assert len(fake.requests) < 5
+        signing.CACHE.clear()
+
+        # Assets of the same item are signed together
+        now = datetime.now(timezone.utc)
+        item = Item("item", None, None, now, {})
+        for url in urls:
+            item.add_asset(url, Asset(url))
+        signed_asset = signing.sign(item.assets[urls[0]])
+        assert signed_asset.href.startswith(f"{urls[0]}?")
+        assert len(fake.requests[-1][1]) == len(urls)
+
+
+def test_async_sign():
+    """Test the asyncio API."""
+    urls = _urls(3 * MAX_URLS)
+    now = datetime.now(timezone.utc)
+    items = ItemCollection([Item(f"item{i}", None, None, now, {}) for i in range(3)])
+    for i, item in enumerate(items):
+        for url in urls[i * MAX_URLS : (i + 1) * MAX_URLS]:
+            item.add_asset(url, Asset(url))
+
+    async def _sign_all():
+        return await asyncio.gather(
+            teledetection.async_sign_item_collection(items),
+            teledetection.async_sign_urls(urls[:10]),
+            teledetection.async_sign(
+                {"version": 1, "templates": {"a": urls[0]}, "refs": {}}
+            ),
+        )
+
+    with FakeSigningEndpoint(delay=0.05) as fake:
+        signed_items, signed_urls, signed_mapping = asyncio.run(_sign_all())
+        requested = [url for _, chunk in fake.requests for url in chunk]
+        assert sorted(requested) == sorted(urls)
+        assert signed_urls == signing.sign_urls(urls[:10])
+        assert signed_mapping["templates"]["a"] == signed_urls[urls[0]]
+        for item, signed_item in zip(items, signed_items):
+            for key, asset in signed_item.assets.items():
+                assert item.assets[key].href == key
+                assert asset.href == signing.CACHE[key].href
+
+        # 5xx are not retried (except by the chunk retry), as with the session
+        n_requests = len(fake.requests)
+        fake.fail_next, fake.fail_status = 2, 503
+        unsigned = _urls(len(urls) + 1)[-1:]
+        should_fail(signing.sign_urls, [unsigned], requests.HTTPError)
+        fake.fail_next = 2
+        coroutine = teledetection.async_sign_urls(unsigned)
+        should_fail(asyncio.run, [coroutine], httpx.HTTPStatusError)
+        assert len(fake.requests) == n_requests + 4
+
+
+class _FakeSearch:  # pylint: disable = R0903
+    """Search returning pages of items."""
+
+    def __init__(self, n_pages: int, n_items: int):
+        """Initialize."""
+        self.n_pages = n_pages
+        self.n_items = n_items
+        self.fetched = 0
+        self.prefetched = threading.Event()
+
+    def pages(self):
+        """Yield pages of items."""
+        now = datetime.now(timezone.utc)
+        for i_page in range(self.n_pages):
+            self.fetched += 1
+            if self.fetched == 2:
+                self.prefetched.set()
+            items = []
+            for i in range(self.n_items):
+                item = Item(f"item{i_page}-{i}", None, None, now, {})
+                item.add_asset("img", Asset(_urls(1)[0].replace("0", f"{i_page}-{i}")))
+                items.append(item)
+            yield ItemCollection(items)
+
+
+def test_sign_iter():
+    """Test the page-by-page signing of search results."""
+    search = _FakeSearch(n_pages=10, n_items=5)
+    with FakeSigningEndpoint() as fake:
+        items = teledetection.sign_iter(search)
+        first = next(items)
+        assert search.prefetched.wait(timeout=10)
+        # Pages are fetched in advance, but not too many
+        assert 2 <= search.fetched <= 4
+        assert first.assets["img"].href.startswith(_urls(1)[0].replace("0", "0-0"))
+        assert len([first, *items]) == 50
+        assert len(fake.requests) == 10
+
+
+def test_copy_assets_only():
+    """Test that only the assets are copied with `CopyStrategy.ASSETS`."""
+    urls = _urls(3)
+    now = datetime.now(timezone.utc)
+    item = Item("item", {"type": "Point", "coordinates": [0, 0]}, None, now, {})
+    for url in urls:
+        item.add_asset(url, Asset(url))
+    with FakeSigningEndpoint():
+        for signed in (
+            teledetection.sign(item, copy=teledetection.CopyStrategy.ASSETS),
+            teledetection.sign(
+                ItemCollection([item], clone_items=False),
+                copy=teledetection.CopyStrategy.ASSETS,
+            ).items[0],
+        ):
+            assert signed.geometry is item.geometry
+            assert signed.properties is item.properties
+            for url in urls:
+                assert item.assets[url].href == url
+                assert signed.assets[url].href.startswith(f"{url}?")
+                assert signed.assets[url].owner is signed
+
+
+def test_sign_mapping():
+    """Test the signing of STAC dicts."""
+    urls = _urls(4)
+    page = {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [0, 0]},
+                "assets": {"a": {"href": urls[i]}, "b": {"href": urls[i + 2]}},
+            }
+            for i in range(2)
+        ],
+    }
+    with FakeSigningEndpoint() as fake:
+        signed = teledetection.sign(page, copy=signing.CopyStrategy.ASSETS)
+        for feature, signed_feature in zip(page["features"], signed["features"]):
+            assert signed_feature["geometry"] is feature["geometry"]
+            for key, asset in signed_feature["assets"].items():
+                assert asset["href"].startswith(f"{feature['assets'][key]['href']}?")
+        assert page["features"][0]["assets"]["a"]["href"] == urls[0]
+
+        # Full copies share nothing with the input
+        copied = teledetection.sign(page)
+        assert copied == signed
+        copied["features"][0]["geometry"]["coordinates"][0] = 1
+        assert page["features"][0]["geometry"]["coordinates"] == [0, 0]
+
+        teledetection.sign_inplace(page)
+        assert page == signed
+        signed_item = teledetection.sign(page["features"][0])
+        assert signed_item == signed["features"][0]
+        assert len(fake.requests) == 1
+
+
+def test_parse_already_signed():
+    """Test the fast parser of already signed URLs against the full parse."""
+    date = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    url = _urls(1)[0]
+    hrefs = [
+        url,
+        f"{url}?X-Amz-Date={date}&X-Amz-Expires=3600&X-Amz-Signature=x",
+        f"{url}?X-Amz-Expires=3600&X-Amz-Date={date}/",
+        f"{url}?X-Amz-Date=&X-Amz-Date={date}&X-Amz-Expires=60",
+        f"{url}?X-Amz-Date={date}&X-Amz-Expires=%2B60",
+        f"{url}?X-%41mz-Date={date}&X-Amz-Expires=60",
+        f"{url}?X-Amz-Date={date}&X-Amz-Expires=1e3",
+        f"{url}?X-Amz-Date=2024131T0000Z&X-Amz-Expires=60",
+        f"{url}?X-Amz-Date=20241301T000000Z&X-Amz-Expires=60",
+        f"{url}#?X-Amz-Date={date}&X-Amz-Expires=60",
+        f"{url}?X-Amz-Date={date}&X-Amz-Expires=60 ",
+    ]
+    for href in hrefs:
+        try:
+            expected = expiry._parse_signed_url_expiry_slow(href)
+        except expiry.NotSignedURL:
+            expected = None
+        assert expiry._parse_signed_url_expiry(href) == expected, href
+
+    signed_url = signing.SignedURL.from_already_signed(hrefs[1])
+    assert signed_url.href == hrefs[1]
+    assert 3500 < signed_url.ttl() <= 3600
+    from_already_signed = signing.SignedURL.from_already_signed
+    should_fail(from_already_signed, [url], signing.NotSignedURL)
+    should_fail(from_already_signed, [hrefs[3]], signing.ExpiredSignedURL)
+
+
+def test_sign_vrt():
+    """Test the signing of VRT strings and files."""
+    urls = _urls(3)
+    vrt = "".join(
+        f"<SourceFilename>/vsicurl/{url}</SourceFilename>\n" for url in urls * 2
+    )
+    with FakeSigningEndpoint() as fake:
+        signed_vrt = signing.sign_vrt_string(vrt)
+        signed_urls = signing.sign_urls(urls)
+        assert signed_vrt == "".join(
+            f"<SourceFilename>/vsicurl/{signed_urls[url].replace('&', '&Amp;')}"
+            "</SourceFilename>\n"
+            for url in urls * 2
+        )
+        assert len(fake.requests) == 1
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            src = os.path.join(tmpdir, "mosaic.vrt")
+            with open(src, "w", encoding="utf8") as file_handle:
+                file_handle.write(vrt)
+            files.VRT_CHUNK_SIZE, chunk_size = 50, files.VRT_CHUNK_SIZE
+            try:
+                files.sign_vrt_file(src)
+            finally:
+                files.VRT_CHUNK_SIZE = chunk_size
+            with open(src, encoding="utf8") as file_handle:
+                assert file_handle.read() == signed_vrt
+            assert os.listdir(tmpdir) == ["mosaic.vrt"]
+
+
+def test_update_href_in_string():
+    """Test the batched signing of the URLs of a text."""
+    urls = _urls(3)
+    contents = "\n".join(
+        f'<layer source="/vsicurl/{url}" link="https://qgis.org"/>' for url in urls
+    )
+    with FakeSigningEndpoint() as fake:
+        signed = files.update_href_in_string(contents, amp=True)
+        assert len(fake.requests) == 1
+        signed_urls = signing.sign_urls(urls)
+        assert signed == "\n".join(
+            f'<layer source="/vsicurl/{signed_urls[url].replace("&", "&amp;")}"'
+            ' link="https://qgis.org"/>'
+            for url in urls
+        )
+        # Already signed URLs are kept
+        assert files.update_href_in_string(signed, amp=True) == signed
+        assert len(fake.requests) == 1
+
+
+def test_update_hrefs_in_file():
+    """Test the streaming signing of a text file."""
+    urls = _urls(20)
+    contents = "".join(
+        f'{{"href": "{url}", "a": "http:// {url}", "b": [{url},{url}]}}\n'
+        for url in urls
+    )
+    with FakeSigningEndpoint(), tempfile.TemporaryDirectory() as tmpdir:
+        expected = files.update_href_in_string(contents, amp=False)
+        filepath = os.path.join(tmpdir, "items.ndjson")
+        for chunk_size in (7, 64, 1000):
+            with open(filepath, "w", encoding="utf8") as file_handle:
+                file_handle.write(contents)
+            files.FILE_CHUNK_SIZE, default_size = chunk_size, files.FILE_CHUNK_SIZE
+            try:
+                files.update_hrefs_in_file(filepath)
+            finally:
+                files.FILE_CHUNK_SIZE = default_size
+            with open(filepath, encoding="utf8") as file_handle:
+                assert file_handle.read() == expected
+        assert os.listdir(tmpdir) == ["items.ndjson"]
+
+
+def test_update_hrefs_in_qgz():
+    """Test the signing of a QGIS project, copying the other entries as is."""
+    urls = _urls(2)
+    project = "".join(f"<datasource>/vsicurl/{url}</datasource>" for url in urls)
+    with FakeSigningEndpoint(), tempfile.TemporaryDirectory() as tmpdir:
+        filepath = os.path.join(tmpdir, "project.qgz")
+        with zipfile.ZipFile(filepath, "w", zipfile.ZIP_DEFLATED) as zout:
+            zout.writestr("project.qgs", project)
+            qgd_data = os.urandom(100_000) + bytes(100_000)
+            zout.writestr("project.qgd", qgd_data)
+        with zipfile.ZipFile(filepath) as zin:
+            qgd_info = zin.getinfo("project.qgd")
+        files.update_hrefs_in_qgz(filepath)
+        signed_urls = signing.sign_urls(urls)
+        with zipfile.ZipFile(filepath) as zin:
+            assert zin.testzip() is None
+            assert zin.read("project.qgs").decode() == "".join(
+                f'<datasource>/vsicurl/{signed_urls[url].replace("&", "&amp;")}'
+                "</datasource>"
+                for url in urls
+            )
+            info = zin.getinfo("project.qgd")
+            assert (info.CRC, info.compress_size) == (
+                qgd_info.CRC,
+                qgd_info.compress_size,
+            )
+            assert zin.read("project.qgd") == qgd_data
+
+        # The central directory is consistent: entries can be appended
+        with zipfile.ZipFile(filepath, "a") as zout:
+            zout.writestr("notes.txt", "notes")
+        with zipfile.ZipFile(filepath) as zin:
+            assert zin.testzip() is None
+            assert zin.namelist() == ["project.qgs", "project.qgd", "notes.txt"]
+            assert zin.read("project.qgd") == qgd_data
+        assert os.listdir(tmpdir) == ["project.qgz"]
+
+
+def test_update_hrefs_in_dir(monkeypatch):
+    """Test the signing of the files of a directory."""
+    urls = _urls(6)
+    contents = {
+        "a.vrt": f"<VRTDataset><S>{urls[0]}</S><S>{urls[1]}</S></VRTDataset>",
+        "sub/b.qgs": f'<layer source="{urls[1]}"/><layer source="{urls[2]}"/>',
+        "sub/c.json": f'{{"refs": ["{urls[3]}", "{urls[4]}"]}}',
+        "d.txt": urls[5],
+    }
+    with FakeSigningEndpoint() as fake, tempfile.TemporaryDirectory() as tmpdir:
+        os.mkdir(os.path.join(tmpdir, "sub"))
+        for name, text in contents.items():
+            with open(os.path.join(tmpdir, name), "w", encoding="utf8") as handle:
+                handle.write(text)
+        updated = files.update_hrefs_in_dir(tmpdir)
+        assert sorted(os.path.relpath(f, tmpdir) for f in updated) == sorted(
+            ["a.vrt", "sub/b.qgs", "sub/c.json"]
+        )
+        assert [len(urls) for _, urls in fake.requests] == [5]
+        signed_urls = signing.sign_urls(urls)
+        with open(os.path.join(tmpdir, "sub/c.json"), encoding="utf8") as handle:
+            refs = json.load(handle)["refs"]
+            assert refs == [signed_urls[urls[3]], signed_urls[urls[4]]]
+
+        # Signed files are skipped, unless they expire soon
+        signing.CACHE.clear()
+        assert not files.update_hrefs_in_dir(tmpdir)
+        monkeypatch.setattr(ENV, "tld_ttl_margin", 7200)
+        assert len(files.update_hrefs_in_dir(tmpdir)) == 3
+
+
+def test_metrics():
+    """Test the signing metrics."""
+    urls = _urls(70)
+    metrics.reset()
+    with FakeSigningEndpoint():
+        teledetection.sign_urls(urls + ["https://example.com/a.tif"])
+        teledetection.sign_urls(urls[:10])
+    snapshot = metrics.snapshot()
+    assert snapshot["tld_signing_urls_total"] == {
+        ("foreign",): 1,
+        ("miss",): 70,
+        ("cache_hit",): 10,
+    }
+    assert snapshot["tld_signing_requests_total"] == {("sign_urls", "ok"): 2}
+    chunk_sizes = snapshot["tld_signing_chunk_size"][("sign_urls",)]
+    assert (chunk_sizes["count"], chunk_sizes["sum"]) == (2, 70)
+    assert chunk_sizes["buckets"][8] == 1
+    assert snapshot["tld_signing_request_seconds"][("sign_urls",)]["count"] == 2
+
+    text = metrics.to_prometheus()
+    assert 'tld_signing_urls_total{outcome="cache_hit"} 10\n' in text
+    assert 'tld_signing_chunk_size_bucket{route="sign_urls",le="+Inf"} 2\n' in text
+    assert "# TYPE tld_signing_request_seconds histogram\n" in text
+
+
+def test_batch_size(monkeypatch):
+    """Test the tunable and adaptive batch size, and compressed requests."""
+    urls = _urls(100)
+    monkeypatch.setattr(ENV, "tld_max_urls", 40)
+    monkeypatch.setattr(ENV, "tld_compress_requests", True)
+    with FakeSigningEndpoint() as fake:
+        signing.sign_urls(urls)
+        assert sorted(len(chunk) for _, chunk in fake.requests) == [20, 40, 40]
+        assert fake.encodings == ["gzip"] * 3
+
+    # The payload stays under the size limit
+    with monkeypatch.context() as patch:
+        max_bytes = 20 * (len(urls[-1]) + batching.URL_JSON_OVERHEAD)
+        patch.setattr(ENV, "tld_max_request_bytes", max_bytes)
+        assert batching.BatchSizer().size(urls[10:]) == 20
+
+    # Additive increase after fast full batches, halved after slow ones
+    monkeypatch.setattr(ENV, "tld_adaptive_batch", True)
+    monkeypatch.setattr(ENV, "tld_adaptive_batch_min", 8)
+    sizer = batching.BatchSizer()
+    assert sizer.size(urls) == 40
+    sizer.record(40, latency=ENV.tld_adaptive_batch_latency + 1, success=True)
+    assert sizer.current == 20
+    sizer.record(10, latency=0.0, success=True)
+    assert sizer.current == 20
+    sizer.record(20, latency=0.0, success=True)
+    assert sizer.current == 28
+    for _ in range(3):
+        sizer.record(28, latency=0.0, success=False)
+    assert sizer.current == 8
+
+
+def test_rate_limit(monkeypatch):
+    """Test the rate limiter, and the backpressure on 429."""
+    with monkeypatch.context() as patch:
+        patch.setattr(ENV, "tld_rate_limit", 20.0)
+        patch.setattr(ENV, "tld_rate_limit_burst", 2)
+        limiter = ratelimit.RateLimiter()
+        delays = [limiter.reserve() for _ in range(4)]
+        assert delays[:2] == [0, 0] and 0.08 < delays[3] <= 0.1
+
+        # Limiters sharing a lock file share their state, like processes
+        with tempfile.TemporaryDirectory() as tmpdir:
+            patch.setattr(ENV, "tld_rate_limit_file", os.path.join(tmpdir, "rl"))
+            limiters = [ratelimit.RateLimiter(), ratelimit.RateLimiter()]
+            delays = [limiter.reserve() for limiter in limiters * 2]
+            assert delays[:2] == [0, 0] and 0.08 < delays[3] <= 0.1
+        patch.setattr(ENV, "tld_rate_limit_file", "")
+
+        # After a pause, requests resume at the limited rate
+        limiter.pause(0.5)
+        first, second = limiter.reserve(), limiter.reserve()
+        assert 0.45 < first <= 0.5 and 0.04 < second - first <= 0.05
+
+    assert ratelimit.retry_after_delay({"Retry-After": "12"}, 0) == 12
+    date = "Wed, 21 Oct 2015 07:28:00 GMT"
+    assert ratelimit.retry_after_delay({"Retry-After": date}, 0) == 0
+    assert ratelimit.retry_after_delay({}, 2) == 4 * ENV.tld_retry_backoff_factor
+
+    # The request after a 429 waits for the `Retry-After` delay
+    waits = []
+    reserve = ratelimit.RATE_LIMITER.reserve
+    monkeypatch.setattr(
+        ratelimit.RATE_LIMITER, "reserve", lambda: waits.append(reserve()) or waits[-1]
+    )
+    metrics.reset()
+    with FakeSigningEndpoint() as fake:
+        fake.throttle_next, fake.retry_after = 1, 0.3
+        signed = signing.sign_urls(_urls(10))
+        assert len(signed) == 10 and len(fake.requests) == 2
+    assert waits[0] == 0 and 0.2 < waits[1] <= 0.3
+    snapshot = metrics.snapshot()
+    assert snapshot["tld_signing_throttled_total"] == {(): 1}
+
+    # Only the last round trip is measured, without the pause
+    latency = snapshot["tld_signing_request_seconds"][("sign_urls",)]
+    assert latency["count"] == 1 and latency["sum"] < 0.3
+
+
+def test_breaker_connection_errors(monkeypatch):
+    """Test that the circuit opens without retrying connection errors."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        endpoint = f"http://127.0.0.1:{sock.getsockname()[1]}/"
+    monkeypatch.setattr(
+        http.session, "_method", BareConnectionMethod(endpoint=endpoint)
+    )
+    connections = []
+
+    def create_connection(*args, **kwargs):
+        connections.append(args[0])
+        return create_connection_orig(*args, **kwargs)
+
+    create_connection_orig = urllib3.util.connection.create_connection
+    monkeypatch.setattr(urllib3.util.connection, "create_connection", create_connection)
+    signing.CACHE.clear()
+    dispatch.BREAKER.reset()
+    try:
+        # Default settings: each signing sends a chunk twice (one retry), and
+        # the circuit opens after 5 failed requests, i.e. 5 connections
+        assert ENV.tld_retry_total == 10 and ENV.tld_signing_chunk_retries == 1
+        for _ in range(2):
+            should_fail(signing.sign_urls, [_urls(1)], requests.ConnectionError)
+        assert len(connections) == 4 and not dispatch.BREAKER.is_open
+        for _ in range(2):
+            should_fail(signing.sign_urls, [_urls(1)], teledetection.SigningUnavailable)
+        assert len(connections) == 5 and dispatch.BREAKER.is_open
+    finally:
+        dispatch.BREAKER.reset()
+
+
+def _raise_in(circuit: breaker.CircuitBreaker, err: Exception):
+    """Raise an error in the guard of a circuit breaker."""
+    with circuit.guard():
+        raise err
+
+
+def test_serve_stale(monkeypatch):
+    """Test the circuit breaker, and the stale URLs served meanwhile."""
+    urls = _urls(3)
+    monkeypatch.setattr(ENV, "tld_breaker_failures", 2)
+    monkeypatch.setattr(ENV, "tld_breaker_cooldown", 30)
+    with FakeSigningEndpoint(duration=ENV.tld_ttl_margin - 300) as fake:
+        signed = signing.sign_urls(urls)
+        fake.fail_next, fake.fail_status = 100, 503
+
+        # The circuit opens after 2 failed requests, and stale URLs are used
+        monkeypatch.setattr(ENV, "tld_serve_stale", True)
+        assert signing.sign_urls(urls) == signed
+        assert len(fake.requests) == 3 and dispatch.BREAKER.is_open
+        assert not signing.REFRESHER.running
+        assert signing.sign_urls(urls) == signed
+        assert len(fake.requests) == 3
+        should_fail(signing.sign_urls, [_urls(4)], teledetection.SigningUnavailable)
+        monkeypatch.setattr(ENV, "tld_serve_stale", False)
+        should_fail(signing.sign_urls, [urls], teledetection.SigningUnavailable)
+
+        # After the cooldown, a request probes the endpoint
+        monkeypatch.setattr(ENV, "tld_breaker_cooldown", 0)
+        fake.fail_next = 0
+        signing.sign_urls(urls)
+        assert len(fake.requests) == 4 and not dispatch.BREAKER.is_open
+
+    # Only transport errors and 5xx/429 responses count as outages
+    monkeypatch.setattr(ENV, "tld_breaker_cooldown", 30)
+    circuit = breaker.CircuitBreaker()
+    for err in (ValueError("invalid"), ImportError("httpx"), ValueError("invalid")):
+        should_fail(_raise_in, [circuit, err], type(err))
+    assert not circuit.is_open
+    for _ in range(2):
+        should_fail(_raise_in, [circuit, requests.ConnectionError()], OSError)
+    assert circuit.is_open
+    signing.stop_refresh_ahead()